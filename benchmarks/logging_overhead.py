@@ -0,0 +1,70 @@
+"""Benchmark the logging overhead per request.
+
+Every simulated request emits what a request to the API logs: a uvicorn access
+log through the standard logging intercept and an application log through Loguru.
+Besides the latency added to the request, the CPU time of the whole process is
+reported, including the sink threads serializing and writing the records.
+The logging configuration is taken from the environment, for example:
+
+    LOG_CONSOLE=false LOG_ACCESS_SAMPLE_RATE=0.1 python benchmarks/logging_overhead.py
+"""
+
+import argparse
+import logging
+import statistics
+import time
+import uuid
+
+from loguru import logger
+
+import conf
+
+
+def simulate_request(access_logger: logging.Logger, request_id: str) -> None:
+    conf.logging.REQUEST_ID.set(request_id)
+    logger.info("Predicting attributes")
+    access_logger.info(
+        '%s - "%s %s HTTP/%s" %d',
+        "127.0.0.1:50000",
+        "POST",
+        "/api/v1/model/predict-attributes",
+        "1.1",
+        200,
+    )
+
+
+def main(n_requests: int) -> None:
+    access_logger = logging.getLogger("uvicorn.access")
+    request_ids = [uuid.uuid4().hex for _ in range(n_requests)]
+
+    timings = []
+    cpu_start = time.process_time()
+    for request_id in request_ids:
+        start = time.perf_counter()
+        simulate_request(access_logger, request_id)
+        timings.append(time.perf_counter() - start)
+
+    # Wait for the queued records to be written before exiting
+    start = time.perf_counter()
+    conf.logging.flush_logs()
+    drain = time.perf_counter() - start
+    # CPU time of all the threads of the process, including the queue drain
+    cpu_per_request_us = (time.process_time() - cpu_start) / n_requests * 1e6
+
+    timings_us = sorted(timing * 1e6 for timing in timings)
+    print(f"requests:          {n_requests}")
+    print(f"access sample rate: {conf.logging.ACCESS_LOG_SAMPLE_RATE}")
+    print(f"mean per request:  {statistics.mean(timings_us):.1f} us")
+    print(f"p50 per request:   {timings_us[len(timings_us) // 2]:.1f} us")
+    print(f"p99 per request:   {timings_us[int(len(timings_us) * 0.99)]:.1f} us")
+    print(f"queue drain:       {drain * 1e3:.1f} ms")
+    print(
+        f"CPU per request:   {cpu_per_request_us:.1f} us (all threads, drain included)"
+    )
+    print(f"dropped records:   {sum(sink.dropped for sink in conf.logging.SINKS)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10_000)
+    main(parser.parse_args().requests)
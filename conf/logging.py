@@ -1,72 +1,209 @@
 from loguru import logger
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+import atexit
+import os
+import queue
+import random
 import sys
+import threading
+import time
 import logging
 from conf import settings
 
+# Request ID of the request being handled, set by the API middleware
+REQUEST_ID: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+def _parse_logger_levels(value: str) -> dict:
+    """Parse per-logger levels such as "uvicorn.access=WARNING,httpx=ERROR"."""
+    levels = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+# Log levels per logger name, "" being the default for all loggers
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOGGER_LEVELS = {"": LOG_LEVEL, **_parse_logger_levels(os.getenv("LOG_LEVELS", ""))}
+
+# Fraction of the successful uvicorn access logs to keep
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("LOG_ACCESS_SAMPLE_RATE", "1.0"))
+
 # Clean up existing Loguru handlers to avoid duplicates
 logger.remove()
 
+
+# Add the request ID to every record
+def add_request_id(record):
+    record["extra"].setdefault("request_id", REQUEST_ID.get())
+
+
+logger.configure(patcher=add_request_id)
+
 # Format string for logs
 log_format = (
     "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
     "<level>{level: <8}</level> | "
+    "{extra[request_id]} | "
     "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> | "
     "<level>{message}</level>"
 )
 
-# Configure file logger for all logs
+# Lowest level any logger is configured with, so that Loguru can skip the rest
+min_level = min(logger.level(level).no for level in LOGGER_LEVELS.values())
+
+
+class RotatingFile:
+    """Append-only log file rotated by size, removing rotated files past retention."""
+
+    def __init__(self, path: Path, max_bytes: int, retention_days: float):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.retention_s = retention_days * 24 * 3600
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, text: str) -> None:
+        self.file.write(text)
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def rotate(self) -> None:
+        self.file.close()
+        self.path.rename(
+            self.path.with_name(f"{self.path.name}.{datetime.now():%Y%m%d_%H%M%S_%f}")
+        )
+        for rotated in self.path.parent.glob(f"{self.path.name}.*"):
+            if time.time() - rotated.stat().st_mtime > self.retention_s:
+                rotated.unlink(missing_ok=True)
+        self.file = open(self.path, "a", encoding="utf-8")
+
+
+class QueueSink:
+    """Non-blocking Loguru sink writing the records from a background thread.
+
+    The records are put on a bounded in-process queue and dropped, rather than
+    blocking the caller, when the writer falls behind.
+    """
+
+    def __init__(self, stream, max_size: int = 10_000, batch_size: int = 256):
+        self.stream = stream
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.queue = queue.Queue(maxsize=max_size)
+        self.thread = threading.Thread(target=self._write, daemon=True)
+        self.thread.start()
+
+    def __call__(self, message):
+        try:
+            self.queue.put_nowait(str(message))
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.stream.write("".join(batch))
+                self.stream.flush()
+            except Exception as e:
+                print(f"Failed to write logs: {e}", file=sys.stderr)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def flush(self):
+        """Wait until all the queued records are written."""
+        self.queue.join()
+
+
+# Configure file logger for all logs as JSON lines, written off the request path
 log_file_path = settings.ROOT / "logs" / "runtime.log"
 log_file_path.parent.mkdir(
     parents=True, exist_ok=True
 )  # Create logs/ directory if needed
 
-logger.add(
-    log_file_path,
-    rotation="1 MB",
-    retention="7 days",
-    level="INFO",
-    format=log_format,
-    enqueue=True,  # Safe for async environments
-)
+SINKS = [QueueSink(RotatingFile(log_file_path, 1_000_000, retention_days=7))]
+logger.add(SINKS[0], level=min_level, filter=LOGGER_LEVELS, serialize=True)
 
 # Add console logger for all logs
-logger.add(sys.stderr, level="INFO", format=log_format)
+if os.getenv("LOG_CONSOLE", "true").lower() == "true":
+    SINKS.append(QueueSink(sys.stderr))
+    logger.add(
+        SINKS[-1],
+        level=min_level,
+        filter=LOGGER_LEVELS,
+        format=log_format,
+        colorize=sys.stderr.isatty(),
+    )
+
 
+def flush_logs():
+    """Wait until all the logs are written, e.g. before exiting."""
+    for sink in SINKS:
+        sink.flush()
 
-# Redirect Loguru's internal errors to the same file logger
-def loguru_error_handler(record):
-    logger.error(f"Loguru internal error: {record}")
 
+atexit.register(flush_logs)
 
-# Add error handler to catch Loguru's internal errors
-logger.add(log_file_path, level="ERROR", format=log_format)
+# Standard logging level numbers to Loguru level names
+LEVEL_NAMES = {
+    logging.CRITICAL: "CRITICAL",
+    logging.ERROR: "ERROR",
+    logging.WARNING: "WARNING",
+    logging.INFO: "INFO",
+    logging.DEBUG: "DEBUG",
+}
 
 
 # Intercept Python's standard logging (used by Uvicorn/FastAPI) and redirect to Loguru
 class InterceptHandler(logging.Handler):
     def emit(self, record):
         # Get corresponding Loguru level
-        try:
-            level = logger.level(record.levelname).name
-        except ValueError:
-            level = record.levelno
-
-        # Find the caller from where the log originated
-        frame, depth = logging.currentframe(), 2
-        while frame.f_code.co_filename == logging.__file__:
-            frame = frame.f_back
-            depth += 1
+        level = LEVEL_NAMES.get(record.levelno, record.levelno)
+
+        # Keep the origin of the record instead of walking the stack to find it
+        def set_origin(loguru_record):
+            loguru_record.update(
+                name=record.name,
+                function=record.funcName,
+                line=record.lineno,
+                module=record.module,
+                # Same (name, path) type as the file of the Loguru records
+                file=type(loguru_record["file"])(record.filename, record.pathname),
+            )
 
         # Log using Loguru
-        logger.opt(depth=depth, exception=record.exc_info).log(
+        logger.patch(set_origin).opt(exception=record.exc_info).log(
             level, record.getMessage()
         )
 
 
+# Keep only a sample of the successful access logs
+class AccessLogSampler(logging.Filter):
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.sample_rate
+
+
 # Configure Uvicorn and FastAPI loggers to use Loguru
 def setup_logging():
     # Redirect all standard logging to Loguru
-    logging.basicConfig(handlers=[InterceptHandler()], level=0, force=True)
+    logging.basicConfig(handlers=[InterceptHandler()], level=min_level, force=True)
 
     # Update loggers for Uvicorn, FastAPI, and root logger
     for logger_name in ("", "uvicorn", "uvicorn.access", "uvicorn.error", "fastapi"):
@@ -74,6 +211,15 @@ def setup_logging():
         py_logger.handlers = [InterceptHandler()]
         py_logger.propagate = False
 
+    # Drop records below the configured levels before they reach Loguru
+    for logger_name, level in LOGGER_LEVELS.items():
+        logging.getLogger(logger_name).setLevel(logger.level(level).no)
+
+    if ACCESS_LOG_SAMPLE_RATE < 1:
+        logging.getLogger("uvicorn.access").addFilter(
+            AccessLogSampler(ACCESS_LOG_SAMPLE_RATE)
+        )
+
 
 # Call setup_logging when the module is imported
 setup_logging()
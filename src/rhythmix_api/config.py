@@ -1,3 +1,5 @@
+from typing import Optional
+
 import pydantic_settings
 
 
@@ -5,6 +7,8 @@ class Settings(pydantic_settings.BaseSettings):
     API_NAME: str = "Rhythmix API"
     VERSION: str = "1.0.0"
     API_STR: str = "/api/v1"
+    # Catalog version the live collection must hold, checked at startup
+    CATALOG_VERSION: Optional[str] = None
 
 
 SETTINGS = Settings()
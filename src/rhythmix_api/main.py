@@ -1,18 +1,40 @@
 """Main module for initialising and defining the FastAPI application"""
 
+import contextlib
 import fastapi
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import os
+import uuid
+import conf
 import rhythmix_api
+from loguru import logger
+from rhythmix_model.preprocessing import snapshot
+from rhythmix_model.recommender import admission, nodes
 
 
 API_STR = rhythmix_api.config.SETTINGS.API_STR
 
+
+@contextlib.asynccontextmanager
+async def lifespan(app: fastapi.FastAPI):
+    # Refuse to start on a collection restored from another catalog version.
+    # Qdrant is only queried when a catalog version is expected.
+    catalog_version = rhythmix_api.config.SETTINGS.CATALOG_VERSION
+    if catalog_version:
+        snapshot.check_catalog_version(
+            nodes.client, nodes.QDRANT_COLLECTION, catalog_version
+        )
+        logger.info(f"Serving catalog version {catalog_version}")
+    yield
+
+
 APP = fastapi.FastAPI(
     title=rhythmix_api.config.SETTINGS.API_NAME,
     version=rhythmix_api.config.SETTINGS.VERSION,
     openapi_url=f"{API_STR}/openapi.json",
+    lifespan=lifespan,
 )
 
 # Setting up Routers
@@ -24,6 +46,46 @@ API_ROUTER.include_router(
 
 APP.include_router(API_ROUTER, prefix=rhythmix_api.config.SETTINGS.API_STR)
 
+
+# Shed requests when the LLM capacity is exhausted
+@APP.exception_handler(admission.OverloadedError)
+async def overloaded_handler(
+    request: fastapi.Request, exc: admission.OverloadedError
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=fastapi.status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+# Tag the logs of every request with its request ID
+class RequestIdMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        request_id = headers.get(b"x-request-id", b"").decode() or uuid.uuid4().hex
+        # Not reset, so that the uvicorn access log of the request carries it too
+        conf.logging.REQUEST_ID.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-request-id", request_id.encode()),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_request_id)
+
+
+APP.add_middleware(RequestIdMiddleware)
+
 # Setting up CORS
 ORIGINS = ["*"]
 
@@ -1,20 +1,83 @@
-from typing import Dict
+from typing import Dict, List, Literal, Optional
 import redis
 import uuid
 import pickle
+from concurrent.futures import ThreadPoolExecutor
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, status
+from pydantic import BaseModel, Field
 
 from rhythmix_api.config import SETTINGS
-from rhythmix_model.recommender import graph
+from loguru import logger
+from rhythmix_model.recommender import graph, nodes, playlist, prefetch
+from rhythmix_model.recommender.validators import AttributeOverrides
 
 
 ROUTER = APIRouter()
 REDIS_CLIENT = redis.Redis(host="localhost", port=6379, db=0)
+PREFETCH_EXECUTOR = ThreadPoolExecutor(thread_name_prefix="prefetch")
+SESSION_TTL_S = 3600
+
+
+class PlaylistContinuation(BaseModel):
+    seed_track_ids: List[str] = Field(min_length=1, max_length=50)
+    played_track_ids: List[str] = Field(default_factory=list)
+    limit: int = Field(default=10, ge=1, le=50)
+
+
+def format_songs(similar_songs: List[Dict]) -> List[Dict]:
+    """Keep the song fields returned to the client."""
+    results = []
+    for songs in similar_songs:
+        results.append(
+            {
+                "track_name": songs["payload"]["track_name"],
+                "track_artist": songs["payload"]["track_artist"],
+                "track_genre": songs["payload"]["track_genre"],
+                "track_link": songs["payload"]["track_link"],
+                "score": songs["score"],
+            }
+        )
+    return results
+
+
+def format_attributes(recommendations: Dict) -> Dict:
+    """Keep the final song attributes returned to the client."""
+    return {
+        "danceability": recommendations["danceability"],
+        "energy": recommendations["energy"],
+        "key": recommendations["key"],
+        "loudness": recommendations["loudness"],
+        "mode": recommendations["mode"],
+        "speechiness": recommendations["speechiness"],
+        "acousticness": recommendations["acousticness"],
+        "instrumentalness": recommendations["instrumentalness"],
+        "liveness": recommendations["liveness"],
+        "valence": recommendations["valence"],
+        "tempo": recommendations["tempo"],
+        "time_signature": recommendations["time_signature"],
+    }
+
+
+def prefetch_similar_songs(session_id: str, attributes: Dict) -> None:
+    """Search the similar songs for the predicted attributes and store them with the session."""
+    try:
+        similar_songs = prefetch.search_similar_songs(attributes)
+    except Exception as e:
+        logger.warning(f"Prefetch for session {session_id} failed: {e}")
+        return
+
+    # Stored under its own expiring key rather than in the session hash, so that
+    # writing it after /song-recommender consumed the session cannot recreate the
+    # session without its graph state or TTL
+    prefetched = {"attributes": attributes, "similar_songs": similar_songs}
+    REDIS_CLIENT.set(
+        f"prefetch:{session_id}", pickle.dumps(prefetched), ex=SESSION_TTL_S
+    )
 
 
 @ROUTER.post("/predict-attributes", status_code=status.HTTP_200_OK)
-async def attributes(prompt: str):
+def attributes(prompt: str):
     initial_state = {"user_query": prompt}
     graph_thread = {"configurable": {"thread_id": str(uuid.uuid4())}}
 
@@ -33,15 +96,21 @@ async def attributes(prompt: str):
     REDIS_CLIENT.hset(f"session:{session_id}", mapping=stored_data)
 
     # Optionally set an expiration time (e.g., 1 hour)
-    REDIS_CLIENT.expire(f"session:{session_id}", 3600)
+    REDIS_CLIENT.expire(f"session:{session_id}", SESSION_TTL_S)
+
+    # Speculatively search the songs for the predicted attributes in the background,
+    # as they are usually accepted unchanged or only slightly adjusted
+    PREFETCH_EXECUTOR.submit(prefetch_similar_songs, session_id, graph_state.values)
 
     return {"data": graph_state.values, "session_id": session_id}
 
 
 @ROUTER.post("/song-recommender", status_code=status.HTTP_200_OK)
-async def recommender(updated_attributes: Dict, session_id: str) -> Dict:
+def recommender(updated_attributes: Dict, session_id: str) -> Dict:
     """
     Takes in the final adjusted attributes and returns a list of recommended songs.
+    The songs prefetched after /predict-attributes are returned directly if the
+    final attributes are within PREFETCH_TOLERANCE of the predicted ones.
 
     Args:
         updated_attributes (Dict): The final adjusted attributes by the user.
@@ -65,6 +134,21 @@ async def recommender(updated_attributes: Dict, session_id: str) -> Dict:
     graph_state = pickle.loads(stored_data[b"graph_state"])
     graph_thread = pickle.loads(stored_data[b"graph_thread"])
 
+    # Answer from the prefetched songs if the attributes barely changed
+    stored_prefetch = REDIS_CLIENT.get(f"prefetch:{session_id}")
+    if stored_prefetch is not None and set(updated_attributes).issubset(
+        prefetch.COMPARED_ATTRIBUTES
+    ):
+        prefetched = pickle.loads(stored_prefetch)
+        final_attributes = {**graph_state.values, **updated_attributes}
+        if prefetch.attributes_match(prefetched["attributes"], final_attributes):
+            logger.info(f"Serving session {session_id} from the prefetched songs")
+            REDIS_CLIENT.delete(f"session:{session_id}", f"prefetch:{session_id}")
+            return {
+                "similar_songs": format_songs(prefetched["similar_songs"]),
+                "attributes": format_attributes(final_attributes),
+            }
+
     # Update the graph state with the new attributes
     graph.compiled_graph.update_state(
         config=graph_state.config,
@@ -76,40 +160,121 @@ async def recommender(updated_attributes: Dict, session_id: str) -> Dict:
     recommendations = graph.compiled_graph.invoke(None, config=graph_thread)
 
     # Save final results
-    results = []
-    for songs in recommendations["similar_songs"]:
-        results.append(
-            {
-                "track_name": songs["payload"]["track_name"],
-                "track_artist": songs["payload"]["track_artist"],
-                "track_genre": songs["payload"]["track_genre"],
-                "track_link": songs["payload"]["track_link"],
-                "score": songs["score"],
-            }
-        )
+    results = format_songs(recommendations["similar_songs"])
 
     # Save the final attributes
-    attributes = {
-        "danceability": recommendations["danceability"],
-        "energy": recommendations["energy"],
-        "key": recommendations["key"],
-        "loudness": recommendations["loudness"],
-        "mode": recommendations["mode"],
-        "speechiness": recommendations["speechiness"],
-        "acousticness": recommendations["acousticness"],
-        "instrumentalness": recommendations["instrumentalness"],
-        "liveness": recommendations["liveness"],
-        "valence": recommendations["valence"],
-        "tempo": recommendations["tempo"],
-        "time_signature": recommendations["time_signature"],
-    }
+    attributes = format_attributes(recommendations)
 
     # Clean up Redis
-    REDIS_CLIENT.delete(f"session:{session_id}")
+    REDIS_CLIENT.delete(f"session:{session_id}", f"prefetch:{session_id}")
 
     return {"similar_songs": results, "attributes": attributes}
 
 
+@ROUTER.post("/recommend", status_code=status.HTTP_200_OK)
+def recommend(
+    prompt: str, attribute_overrides: Optional[AttributeOverrides] = None
+) -> Dict:
+    """
+    Predicts the attributes and returns the recommended songs in a single call,
+    without storing a session for the attributes to be edited.
+
+    Args:
+        prompt (str): The description of the songs to recommend.
+        attribute_overrides (AttributeOverrides, optional): Attributes to use instead of
+        the predicted ones. Unknown or out-of-range attributes are rejected.
+        For example,
+        attribute_overrides =
+            {
+                "danceability": 0.9
+            }
+
+    Returns:
+        Dict: Keys "similar_songs", "attributes" and "attributes_fallback" where attributes
+        are the predicted attributes after the overrides.
+    """
+    attribute_overrides = (
+        attribute_overrides.model_dump(exclude_none=True) if attribute_overrides else {}
+    )
+
+    recommendations = graph.oneshot_graph.invoke(
+        input={"user_query": prompt, "attribute_overrides": attribute_overrides}
+    )
+
+    return {
+        "similar_songs": format_songs(recommendations["similar_songs"]),
+        "attributes": format_attributes(recommendations),
+        "attributes_fallback": recommendations["attributes_fallback"],
+    }
+
+
+@ROUTER.post("/playlist-continuation", status_code=status.HTTP_200_OK)
+def playlist_continuation(request: PlaylistContinuation) -> Dict:
+    """
+    Takes the tracks of a playlist and returns the tracks to continue it with.
+
+    Args:
+        request (PlaylistContinuation): The seed track IDs (1 to 50), the track IDs
+        already played, which are excluded along with the seeds, and the number
+        of tracks to return.
+
+    Returns:
+        Dict: Key "similar_songs" with the ranked continuations.
+    """
+    similar_songs = playlist.continue_playlist(
+        seed_track_ids=request.seed_track_ids,
+        played_track_ids=request.played_track_ids,
+        limit=request.limit,
+    )
+    if not similar_songs:
+        raise HTTPException(status_code=404, detail="No continuations found")
+
+    return {"similar_songs": format_songs(similar_songs)}
+
+
+@ROUTER.get("/autocomplete", status_code=status.HTTP_200_OK)
+def autocomplete(
+    q: str,
+    kind: Literal["artist", "track"] = "artist",
+    limit: int = Query(default=10, ge=1, le=50),
+) -> Dict[str, List[str]]:
+    """
+    Suggests artist or track names from the catalog that start with the typed text.
+
+    Args:
+        q (str): The text typed so far. Case, accents and punctuation are ignored.
+        kind (str): Either "artist" or "track".
+        limit (int): Maximum number of suggestions.
+
+    Returns:
+        Dict: Key "suggestions" with the matching catalog names.
+    """
+    return {
+        "suggestions": nodes.catalog_resolver.autocomplete(q, kind=kind, limit=limit)
+    }
+
+
+@ROUTER.get("/llm-admission", status_code=status.HTTP_200_OK)
+def llm_admission() -> Dict:
+    """
+    Returns the LLM admission control metrics: calls in flight, queue depth,
+    admitted and shed calls, and the wait time for admission.
+    """
+    return nodes.llm_admission.stats()
+
+
+@ROUTER.get("/shadow-queries", status_code=status.HTTP_200_OK)
+def shadow_queries() -> Dict:
+    """
+    Returns the comparison of the shadow collections against the live collection:
+    latency, top-k overlap with the live results and the top-k score distribution.
+    """
+    return {
+        "collection": nodes.QDRANT_COLLECTION,
+        **nodes.shadow_queries.stats(),
+    }
+
+
 @ROUTER.get("/version", status_code=status.HTTP_200_OK)
 def model_version() -> Dict:
     return {"version": SETTINGS.VERSION}
@@ -1,13 +1,30 @@
 import pandas as pd
 from dotenv import load_dotenv
+import json
 import os
 import time
 from pathlib import Path
-from typing import List, Literal
+from typing import Dict, List, Literal, Optional
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
+from rhythmix_model.preprocessing import snapshot
 from conf import settings
 
+ATTRIBUTE_COLUMNS = [
+    "danceability",
+    "energy",
+    "key",
+    "loudness",
+    "mode",
+    "speechiness",
+    "acousticness",
+    "instrumentalness",
+    "liveness",
+    "valence",
+    "tempo",
+    "time_signature",
+]
+
 
 def set_up_vectors(data_path: Path) -> pd.DataFrame:
     """Set up vectors for the cleaned dataset.
@@ -45,11 +62,76 @@ def set_up_vectors(data_path: Path) -> pd.DataFrame:
     return df_vectors
 
 
+def _summarise_attributes(df_group: pd.DataFrame) -> Dict:
+    """Compute the mean and median attribute vectors of a group of tracks."""
+    attributes = df_group.loc[:, ATTRIBUTE_COLUMNS]
+    return {
+        "count": int(len(df_group)),
+        "mean": [round(float(value), 4) for value in attributes.mean()],
+        "median": [round(float(value), 4) for value in attributes.median()],
+    }
+
+
+def compute_attribute_priors(
+    df_vectors: pd.DataFrame, min_artist_tracks: int = 3
+) -> Dict:
+    """Compute per-genre and per-artist attribute priors from the catalog.
+
+    The priors are used as a fast local fallback when the LLM does not predict
+    the song attributes within the latency budget.
+
+    Args:
+        df_vectors (pd.DataFrame): DataFrame containing the track vectors.
+        min_artist_tracks (int, optional): Minimum number of tracks an artist needs
+            to get its own prior. Defaults to 3.
+
+    Returns:
+        Dict: Lookup table with the "global", "genre" and "artist" priors. Each prior
+        holds the track count and the mean and median vectors ordered as "attributes".
+    """
+    priors = {
+        "attributes": ATTRIBUTE_COLUMNS,
+        "global": _summarise_attributes(df_vectors),
+        "genre": {},
+        "artist": {},
+    }
+
+    for genre, df_genre in df_vectors.groupby("track_genre"):
+        priors["genre"][genre] = _summarise_attributes(df_genre)
+
+    # Tracks with several artists are stored as "artist_1;artist_2"
+    df_artists = df_vectors.assign(
+        artist=lambda df_: df_["artists"].str.split(";")
+    ).explode("artist")
+    df_artists = df_artists[df_artists["artist"].str.strip() != ""]
+
+    for artist, df_artist in df_artists.groupby("artist"):
+        if len(df_artist) < min_artist_tracks:
+            continue
+        prior = _summarise_attributes(df_artist)
+        prior["genre"] = df_artist["track_genre"].mode().iloc[0]
+        priors["artist"][artist] = prior
+
+    return priors
+
+
+def save_attribute_priors(priors: Dict, save_path: Path) -> None:
+    """Save the attribute priors lookup table as JSON.
+
+    Args:
+        priors (Dict): Attribute priors from compute_attribute_priors.
+        save_path (Path): Path to save the lookup table to.
+    """
+    with open(save_path, "w", encoding="utf-8") as f:
+        json.dump(priors, f, ensure_ascii=False)
+
+
 def batch_upsert(
     client: QdrantClient,
     collection_name: str,
     points: List[models.PointStruct],
     BATCH_SIZE: int = 100,
+    shard_key_selector: Optional[str] = None,
 ) -> None:
     """Upsert data to Qdrant in batches.
 
@@ -58,12 +140,17 @@ def batch_upsert(
         collection_name (str): Name of the collection to upsert data into.
         points (List[models.PointStruct]): List of points to upsert.
         BATCH_SIZE (int, optional): Number of rows to insert to database at one time. Defaults to 100.
+        shard_key_selector (str, optional): Shard key to upsert the points into. Defaults to None.
     """
 
     for i in range(0, len(points), BATCH_SIZE):
         batch = points[i : i + BATCH_SIZE]
         try:
-            client.upsert(collection_name=collection_name, points=batch)
+            client.upsert(
+                collection_name=collection_name,
+                points=batch,
+                shard_key_selector=shard_key_selector,
+            )
         except Exception as e:
             print(f"Batch {i//BATCH_SIZE + 1} failed: {e}")
             time.sleep(1)
@@ -74,6 +161,9 @@ def create_vector_db(
     df_vectors: pd.DataFrame,
     distance_metric: Literal["cosine", "euclidean"],
     collection_name: str,
+    shard_number: Optional[int] = None,
+    shard_by_genre: bool = False,
+    metadata: Optional[Dict] = None,
 ) -> None:
     """Create the vector database in Qdrant.
 
@@ -82,6 +172,14 @@ def create_vector_db(
         df_vectors (pd.DataFrame): DataFrame containing the track vectors.
         distance_metric (str): Distance metric to use for the vector database.
         collection_name (str): Name of the collection to create.
+        shard_number (int, optional): Number of shards of the collection, or of each
+            genre when sharding by genre. Defaults to None for Qdrant's default.
+        shard_by_genre (bool, optional): Whether to use custom sharding with one shard
+            key per track_genre, so that genre-filtered queries only touch that
+            genre's shards. Requires Qdrant in distributed mode. Defaults to False.
+        metadata (Dict, optional): Catalog metadata stored for the collection once its
+            points are upserted, such as the catalog version checked by the API at
+            startup. See snapshot.set_catalog_metadata. Defaults to None.
     """
 
     # 1. Determine distance metric
@@ -98,10 +196,16 @@ def create_vector_db(
     client.create_collection(
         collection_name=collection_name,
         vectors_config=models.VectorParams(size=12, distance=distance),
+        shard_number=shard_number,
+        sharding_method=models.ShardingMethod.CUSTOM if shard_by_genre else None,
     )
+    if shard_by_genre:
+        for genre in df_vectors["track_genre"].unique():
+            client.create_shard_key(collection_name=collection_name, shard_key=genre)
 
     # 3. Prepare data for Qdrant
     points = []
+    points_genres = []
     for idx, row in df_vectors.iterrows():
         vector = [
             row["danceability"],
@@ -127,9 +231,26 @@ def create_vector_db(
 
         point = models.PointStruct(id=idx, vector=vector, payload=payload)
         points.append(point)
+        points_genres.append(row["track_genre"])
+
+    # 4. Push data to Qdrant, into the shard key of each genre if sharded
+    if not shard_by_genre:
+        batch_upsert(client=client, collection_name=collection_name, points=points)
+    else:
+        genre_points: Dict[str, List[models.PointStruct]] = {}
+        for point, genre in zip(points, points_genres):
+            genre_points.setdefault(genre, []).append(point)
+        for genre, genre_batch in genre_points.items():
+            batch_upsert(
+                client=client,
+                collection_name=collection_name,
+                points=genre_batch,
+                shard_key_selector=genre,
+            )
 
-    # 4. Push data to Qdrant
-    batch_upsert(client=client, collection_name=collection_name, points=points)
+    # 5. Version the collection once its points are in
+    if metadata is not None:
+        snapshot.set_catalog_metadata(client, collection_name, metadata)
 
 
 if __name__ == "__main__":
@@ -153,12 +274,34 @@ if __name__ == "__main__":
             "Missing QDRANT_ENDPOINT in environment variables. Please set it up in your .env file."
         )
 
+    # Optionally shard the collections by genre, e.g. QDRANT_SHARD_BY_GENRE=true
+    # and QDRANT_SHARD_NUMBER=2 for two shards per genre
+    SHARD_BY_GENRE = os.getenv("QDRANT_SHARD_BY_GENRE", "false").lower() == "true"
+    SHARD_NUMBER = os.getenv("QDRANT_SHARD_NUMBER")
+    SHARD_NUMBER = int(SHARD_NUMBER) if SHARD_NUMBER else None
+
     # Set up the Qdrant client
     client = QdrantClient(url=QDRANT_ENDPOINT, api_key=QDRANT_API_KEY)
 
     # Prepare the vectors to be inserted into the database
     df_vectors = set_up_vectors(data_path=Path(settings.DATA_DIR, "clean_data.csv"))
 
+    # Version the catalog, so that the API can check it serves the expected one
+    CATALOG_METADATA = {
+        "catalog_version": snapshot.compute_catalog_version(
+            Path(settings.DATA_DIR, "clean_data.csv")
+        ),
+        "feature_scaling": snapshot.feature_scaling_metadata(
+            df_vectors, ATTRIBUTE_COLUMNS
+        ),
+    }
+
+    # Precompute the genre and artist attribute priors used as the LLM fallback
+    save_attribute_priors(
+        priors=compute_attribute_priors(df_vectors),
+        save_path=Path(settings.DATA_DIR, "attribute_priors.json"),
+    )
+
     # Create the vector database in Qdrant
     # 1. Cosine distance metric
     create_vector_db(
@@ -166,6 +309,9 @@ if __name__ == "__main__":
         df_vectors=df_vectors,
         distance_metric="cosine",
         collection_name="music_vectors",
+        shard_number=SHARD_NUMBER,
+        shard_by_genre=SHARD_BY_GENRE,
+        metadata=CATALOG_METADATA,
     )
 
     # 2. Manhattan distance metric
@@ -174,6 +320,9 @@ if __name__ == "__main__":
         df_vectors=df_vectors,
         distance_metric="manhattan",
         collection_name="music_vectors_manhattan",
+        shard_number=SHARD_NUMBER,
+        shard_by_genre=SHARD_BY_GENRE,
+        metadata=CATALOG_METADATA,
     )
 
     # 3. Euclidean distance metric
@@ -182,4 +331,26 @@ if __name__ == "__main__":
         df_vectors=df_vectors,
         distance_metric="euclidean",
         collection_name="music_vectors_euclidean",
+        shard_number=SHARD_NUMBER,
+        shard_by_genre=SHARD_BY_GENRE,
+        metadata=CATALOG_METADATA,
     )
+
+    # Save the collections as snapshot artifacts for fast restores, see snapshot.py.
+    # The snapshots of the genre-sharded collections would miss the remote shards.
+    if SHARD_BY_GENRE:
+        print("Skipping the snapshot artifacts of the genre-sharded collections")
+    else:
+        for collection_name in [
+            "music_vectors",
+            "music_vectors_manhattan",
+            "music_vectors_euclidean",
+        ]:
+            artifact_path = snapshot.create_snapshot_artifact(
+                client=client,
+                collection_name=collection_name,
+                output_dir=Path(settings.ROOT, "artifacts"),
+                qdrant_url=QDRANT_ENDPOINT,
+                api_key=QDRANT_API_KEY,
+            )
+            print(f"Saved snapshot artifact to {artifact_path}")
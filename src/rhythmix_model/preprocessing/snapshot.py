@@ -0,0 +1,417 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import tarfile
+import tempfile
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+import httpx
+import pandas as pd
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from conf import settings
+
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+SNAPSHOT_NAME = "collection.snapshot"
+POINTS_NAME = "points.jsonl"
+
+# The pinned qdrant-client has no collection metadata, so the catalog metadata of
+# every collection is stored as the payload of a point in this collection
+CATALOG_METADATA_COLLECTION = "catalog_metadata"
+
+
+def compute_catalog_version(data_path: Path) -> str:
+    """Compute the catalog version as the hash of the cleaned dataset.
+
+    Args:
+        data_path (Path): Path to the cleaned dataset.
+
+    Returns:
+        str: The first 12 characters of the dataset's SHA-256.
+    """
+    sha256 = hashlib.sha256()
+    with open(data_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()[:12]
+
+
+def feature_scaling_metadata(df_vectors: pd.DataFrame, features: list) -> Dict:
+    """Describe how the features are scaled in the stored vectors.
+
+    The vectors currently store the raw attribute values, so the scaling is the
+    identity. The feature ranges are kept to detect a drift of the catalog.
+
+    Args:
+        df_vectors (pd.DataFrame): DataFrame containing the track vectors.
+        features (list): The attributes in vector order.
+
+    Returns:
+        Dict: The feature order, scaling method and per-feature min and max.
+    """
+    return {
+        "features": features,
+        "method": "identity",
+        "min": [float(df_vectors[feature].min()) for feature in features],
+        "max": [float(df_vectors[feature].max()) for feature in features],
+    }
+
+
+def _catalog_metadata_point_id(collection_name: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"catalog_metadata/{collection_name}"))
+
+
+def set_catalog_metadata(
+    client: QdrantClient, collection_name: str, metadata: Dict
+) -> None:
+    """Store the catalog metadata of a collection in CATALOG_METADATA_COLLECTION.
+
+    Args:
+        client (QdrantClient): Qdrant client instance.
+        collection_name (str): Name of the collection the metadata describes.
+        metadata (Dict): Catalog metadata, such as the catalog version.
+    """
+    if not client.collection_exists(CATALOG_METADATA_COLLECTION):
+        client.create_collection(
+            collection_name=CATALOG_METADATA_COLLECTION,
+            vectors_config=models.VectorParams(size=1, distance=models.Distance.DOT),
+        )
+    client.upsert(
+        collection_name=CATALOG_METADATA_COLLECTION,
+        points=[
+            models.PointStruct(
+                id=_catalog_metadata_point_id(collection_name),
+                vector=[1.0],
+                payload={"collection_name": collection_name, "metadata": metadata},
+            )
+        ],
+        wait=True,
+    )
+
+
+def get_catalog_metadata(client: QdrantClient, collection_name: str) -> Dict:
+    """Read the catalog metadata stored for the collection at ingestion."""
+    if not client.collection_exists(CATALOG_METADATA_COLLECTION):
+        return {}
+    points = client.retrieve(
+        collection_name=CATALOG_METADATA_COLLECTION,
+        ids=[_catalog_metadata_point_id(collection_name)],
+        with_payload=True,
+    )
+    return points[0].payload["metadata"] if points else {}
+
+
+def check_catalog_version(
+    client: QdrantClient, collection_name: str, expected_version: str
+) -> None:
+    """Verify that the loaded collection holds the expected catalog version.
+
+    Args:
+        client (QdrantClient): Qdrant client instance.
+        collection_name (str): Name of the collection to check.
+        expected_version (str): The catalog version the service expects.
+
+    Raises:
+        RuntimeError: If the collection holds another catalog version.
+    """
+    loaded_version = get_catalog_metadata(client, collection_name).get(
+        "catalog_version"
+    )
+    if loaded_version != expected_version:
+        raise RuntimeError(
+            f"Collection {collection_name} holds catalog version {loaded_version}, "
+            f"expected {expected_version}. Restore the matching snapshot artifact."
+        )
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _has_remote_shards(client: QdrantClient, collection_name: str) -> bool:
+    """Check whether some shards of the collection live on other Qdrant nodes."""
+    try:
+        cluster_info = client.http.distributed_api.collection_cluster_info(
+            collection_name
+        )
+    except NotImplementedError:
+        # Local-mode Qdrant has no REST API and no cluster
+        return False
+    return bool(cluster_info.result.remote_shards)
+
+
+def _download_snapshot(
+    client: QdrantClient,
+    collection_name: str,
+    qdrant_url: str,
+    api_key: Optional[str],
+    save_path: Path,
+) -> None:
+    """Create a Qdrant snapshot of the collection and download it."""
+    snapshot = client.create_snapshot(collection_name=collection_name, wait=True)
+    try:
+        with httpx.stream(
+            "GET",
+            f"{qdrant_url.rstrip('/')}/collections/{collection_name}/snapshots/{snapshot.name}",
+            headers={"api-key": api_key} if api_key else None,
+            timeout=None,
+        ) as response:
+            response.raise_for_status()
+            with open(save_path, "wb") as f:
+                for chunk in response.iter_bytes():
+                    f.write(chunk)
+    finally:
+        client.delete_snapshot(
+            collection_name=collection_name, snapshot_name=snapshot.name
+        )
+
+
+def _export_points(client: QdrantClient, collection_name: str, save_path: Path) -> int:
+    """Export all the points of the collection as JSON lines."""
+    count = 0
+    offset = None
+    with open(save_path, "w", encoding="utf-8") as f:
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name,
+                limit=1000,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            for point in points:
+                f.write(
+                    json.dumps(
+                        {
+                            "id": point.id,
+                            "vector": point.vector,
+                            "payload": point.payload,
+                        }
+                    )
+                    + "\n"
+                )
+            count += len(points)
+            if offset is None:
+                return count
+
+
+def create_snapshot_artifact(
+    client: QdrantClient,
+    collection_name: str,
+    output_dir: Path,
+    qdrant_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> Path:
+    """Save the collection as a versioned snapshot artifact.
+
+    The artifact is a tar file named after the collection and its catalog version.
+    It holds a manifest with the catalog metadata and the Qdrant snapshot of the
+    collection, which includes the HNSW index. Local-mode Qdrant does not support
+    snapshots, so its points are exported instead.
+
+    A Qdrant snapshot only contains the shards of the node it is taken on, so
+    collections with shards on other nodes, such as the genre-sharded collections
+    of a distributed deployment, are refused.
+
+    Args:
+        client (QdrantClient): Qdrant client instance.
+        collection_name (str): Name of the collection to snapshot.
+        output_dir (Path): Directory to save the artifact to.
+        qdrant_url (str, optional): URL of the Qdrant server, to download the
+            snapshot from. Defaults to None for local-mode Qdrant.
+        api_key (str, optional): Qdrant API key. Defaults to None.
+
+    Returns:
+        Path: Path to the artifact.
+
+    Raises:
+        ValueError: If some shards of the collection live on other Qdrant nodes.
+    """
+    if _has_remote_shards(client, collection_name):
+        raise ValueError(
+            f"Collection {collection_name} has shards on other Qdrant nodes, which "
+            "its snapshot would not contain. Snapshot artifacts are not supported "
+            "for distributed collections."
+        )
+
+    collection = client.get_collection(collection_name)
+    catalog_metadata = get_catalog_metadata(client, collection_name)
+    catalog_version = catalog_metadata.get("catalog_version", "unversioned")
+    vectors_config = collection.config.params.vectors
+
+    manifest = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "collection_name": collection_name,
+        "catalog_version": catalog_version,
+        "catalog_metadata": catalog_metadata,
+        "vector_size": vectors_config.size,
+        "distance": vectors_config.distance.value,
+        "points_count": client.count(collection_name, exact=True).count,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    artifact_path = Path(output_dir, f"{collection_name}-{catalog_version}.tar")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        try:
+            data_path = Path(tmp_dir, SNAPSHOT_NAME)
+            _download_snapshot(client, collection_name, qdrant_url, api_key, data_path)
+        except NotImplementedError:
+            data_path = Path(tmp_dir, POINTS_NAME)
+            _export_points(client, collection_name, data_path)
+        manifest["data"] = data_path.name
+
+        with tarfile.open(artifact_path, "w") as tar:
+            _add_bytes(tar, MANIFEST_NAME, json.dumps(manifest, indent=2).encode())
+            tar.add(data_path, arcname=data_path.name)
+
+    return artifact_path
+
+
+def restore_snapshot_artifact(
+    client: QdrantClient,
+    artifact_path: Path,
+    collection_name: Optional[str] = None,
+    qdrant_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> Dict:
+    """Restore a collection from a snapshot artifact.
+
+    Args:
+        client (QdrantClient): Qdrant client instance.
+        artifact_path (Path): Path to the artifact from create_snapshot_artifact.
+        collection_name (str, optional): Name of the collection to restore into.
+            Defaults to the name of the snapshotted collection.
+        qdrant_url (str, optional): URL of the Qdrant server, to upload the
+            snapshot to. Defaults to None for local-mode Qdrant.
+        api_key (str, optional): Qdrant API key. Defaults to None.
+
+    Returns:
+        Dict: The manifest of the artifact.
+
+    Raises:
+        RuntimeError: If the restored collection does not hold the number of points
+            or the catalog version recorded in the manifest.
+    """
+    with tarfile.open(artifact_path, "r") as tar:
+        manifest = json.load(tar.extractfile(MANIFEST_NAME))
+        collection_name = collection_name or manifest["collection_name"]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tar.extract(manifest["data"], path=tmp_dir, filter="data")
+            data_path = Path(tmp_dir, manifest["data"])
+
+            if manifest["data"] == SNAPSHOT_NAME:
+                if qdrant_url is None:
+                    raise ValueError(
+                        "Restoring a Qdrant snapshot requires the URL of a Qdrant server."
+                    )
+                with open(data_path, "rb") as f:
+                    response = httpx.post(
+                        f"{qdrant_url.rstrip('/')}/collections/{collection_name}/snapshots/upload",
+                        params={"priority": "snapshot", "wait": "true"},
+                        headers={"api-key": api_key} if api_key else None,
+                        files={"snapshot": (SNAPSHOT_NAME, f)},
+                        timeout=None,
+                    )
+                response.raise_for_status()
+            else:
+                if client.collection_exists(collection_name):
+                    client.delete_collection(collection_name)
+                client.create_collection(
+                    collection_name=collection_name,
+                    vectors_config=models.VectorParams(
+                        size=manifest["vector_size"],
+                        distance=models.Distance(manifest["distance"]),
+                    ),
+                )
+                with open(data_path, encoding="utf-8") as f:
+                    client.upload_points(
+                        collection_name=collection_name,
+                        points=(models.PointStruct(**json.loads(line)) for line in f),
+                        batch_size=1000,
+                        wait=True,
+                    )
+
+    points_count = client.count(collection_name, exact=True).count
+    if points_count != manifest["points_count"]:
+        raise RuntimeError(
+            f"Restored {points_count} points into {collection_name}, "
+            f"expected {manifest['points_count']}."
+        )
+
+    set_catalog_metadata(client, collection_name, manifest["catalog_metadata"])
+    if "catalog_version" in manifest["catalog_metadata"]:
+        check_catalog_version(client, collection_name, manifest["catalog_version"])
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Create or restore versioned snapshot artifacts of the vector collections."
+    )
+    parser.add_argument(
+        "--local-path",
+        type=Path,
+        default=None,
+        help="Path of a local-mode Qdrant instead of QDRANT_ENDPOINT",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser("create")
+    create_parser.add_argument("--collection", default="music_vectors")
+    create_parser.add_argument(
+        "--output-dir", type=Path, default=Path(settings.ROOT, "artifacts")
+    )
+
+    restore_parser = subparsers.add_parser("restore")
+    restore_parser.add_argument("artifact_path", type=Path)
+    restore_parser.add_argument("--collection", default=None)
+
+    args = parser.parse_args()
+
+    load_dotenv(settings.ROOT / ".env")
+    QDRANT_ENDPOINT = os.getenv("QDRANT_ENDPOINT")
+    QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+
+    if args.local_path:
+        QDRANT_ENDPOINT = QDRANT_API_KEY = None
+        client = QdrantClient(path=str(args.local_path))
+    elif QDRANT_ENDPOINT:
+        client = QdrantClient(url=QDRANT_ENDPOINT, api_key=QDRANT_API_KEY)
+    else:
+        raise RuntimeError(
+            "Missing QDRANT_ENDPOINT in environment variables. Please set it up in your .env file, or use --local-path."
+        )
+
+    if args.command == "create":
+        artifact_path = create_snapshot_artifact(
+            client=client,
+            collection_name=args.collection,
+            output_dir=args.output_dir,
+            qdrant_url=QDRANT_ENDPOINT,
+            api_key=QDRANT_API_KEY,
+        )
+        print(f"Saved snapshot artifact to {artifact_path}")
+    else:
+        manifest = restore_snapshot_artifact(
+            client=client,
+            artifact_path=args.artifact_path,
+            collection_name=args.collection,
+            qdrant_url=QDRANT_ENDPOINT,
+            api_key=QDRANT_API_KEY,
+        )
+        print(
+            f"Restored {manifest['points_count']} points of catalog version "
+            f"{manifest['catalog_version']} into {args.collection or manifest['collection_name']}"
+        )
@@ -0,0 +1,184 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+
+class OverloadedError(Exception):
+    """Raised when a request is shed because the LLM capacity is exhausted."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"LLM capacity exhausted: {reason}")
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """Token bucket refilled continuously up to a per-minute capacity.
+
+    A per-minute rate of 0 disables the limit.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.refill_per_s = per_minute / 60
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.refill_per_s
+        )
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until the amount can be consumed, 0 if it can be consumed now."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.refill_per_s)
+
+    def consume(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.tokens -= min(amount, self.capacity)
+
+
+class AdmissionController:
+    """Concurrency limiter and rate-limit aware scheduler for the LLM calls.
+
+    Callers wait in a bounded queue until a concurrency slot is free and the
+    requests/min and tokens/min buckets allow the call. Requests are shed with
+    OverloadedError when the queue is full, or when they cannot be admitted
+    before their deadline.
+
+    Args:
+        max_concurrency (int): Maximum number of LLM calls in flight.
+        requests_per_minute (float): Requests/min limit, 0 to disable.
+        tokens_per_minute (float): Tokens/min limit, 0 to disable.
+        max_queue (int): Maximum number of callers waiting for admission.
+        max_wait_s (float): Default deadline for a caller to be admitted.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_queue: int,
+        max_wait_s: float,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._queue_depth = 0
+        self._max_queue_depth = 0
+        self._admitted = 0
+        self._shed = 0
+        self._wait_times = deque(maxlen=1000)
+
+    def _rate_wait_time(self, estimated_tokens: float, now: float) -> float:
+        return max(
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(estimated_tokens, now),
+        )
+
+    def _shed_request(self, reason: str, retry_after: float) -> OverloadedError:
+        self._shed += 1
+        return OverloadedError(reason, retry_after)
+
+    def acquire(self, estimated_tokens: float, max_wait_s: Optional[float] = None):
+        """Wait until the LLM call is admitted.
+
+        Args:
+            estimated_tokens (float): Estimated prompt and completion tokens of the call.
+            max_wait_s (float, optional): Deadline to be admitted. Defaults to the
+                controller's max_wait_s.
+
+        Raises:
+            OverloadedError: If the call cannot be admitted before the deadline.
+        """
+        start = time.monotonic()
+        deadline = start + (self.max_wait_s if max_wait_s is None else max_wait_s)
+
+        with self._condition:
+            if self._queue_depth >= self.max_queue:
+                raise self._shed_request(
+                    "queue full", self._rate_wait_time(estimated_tokens, start)
+                )
+
+            self._queue_depth += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue_depth)
+            try:
+                while True:
+                    now = time.monotonic()
+                    rate_wait = self._rate_wait_time(estimated_tokens, now)
+                    if self._in_flight < self.max_concurrency and rate_wait == 0:
+                        break
+
+                    # Shed right away if the rate limits cannot free up in time
+                    remaining = deadline - now
+                    if remaining <= 0 or rate_wait > remaining:
+                        raise self._shed_request(
+                            "deadline exceeded", max(rate_wait, self.max_wait_s)
+                        )
+
+                    self._condition.wait(
+                        timeout=min(remaining, rate_wait) if rate_wait else remaining
+                    )
+
+                self.requests.consume(1)
+                self.tokens.consume(estimated_tokens)
+                self._in_flight += 1
+                self._admitted += 1
+                self._wait_times.append(time.monotonic() - start)
+            finally:
+                self._queue_depth -= 1
+
+    def release(self) -> None:
+        """Free the concurrency slot of an admitted LLM call."""
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(
+        self, estimated_tokens: float, max_wait_s: Optional[float] = None
+    ) -> Iterator[None]:
+        """Hold a concurrency slot for the duration of the LLM call."""
+        self.acquire(estimated_tokens, max_wait_s=max_wait_s)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict:
+        """Queue depth, admission and wait time metrics."""
+        with self._condition:
+            wait_times = sorted(self._wait_times)
+            return {
+                "in_flight": self._in_flight,
+                "queue_depth": self._queue_depth,
+                "max_queue_depth": self._max_queue_depth,
+                "admitted": self._admitted,
+                "shed": self._shed,
+                "wait_time_avg_s": (
+                    sum(wait_times) / len(wait_times) if wait_times else 0.0
+                ),
+                "wait_time_p95_s": (
+                    wait_times[int(0.95 * (len(wait_times) - 1))] if wait_times else 0.0
+                ),
+                "wait_time_max_s": wait_times[-1] if wait_times else 0.0,
+            }
+
+
+def estimate_tokens(text: str, completion_tokens: int) -> int:
+    """Roughly estimate the tokens of an LLM call, at 4 characters per token."""
+    return len(text) // 4 + completion_tokens
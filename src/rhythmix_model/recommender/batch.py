@@ -0,0 +1,285 @@
+"""Run natural-language prompts through the recommender in bulk.
+
+Reads a JSONL file of prompts, one {"id": ..., "prompt": ...} object per line,
+and appends one result per prompt to the output JSONL file. Prompts without an
+"id" are identified by their line number. Prompts already in the output file are
+skipped, so an interrupted run resumes where it stopped. Prompts that failed or
+fell back to the attribute priors are not written, so a rerun retries them.
+
+    python -m rhythmix_model.recommender.batch prompts.jsonl results.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+from loguru import logger
+from qdrant_client.http import models
+
+from rhythmix_model.recommender import admission, nodes
+
+
+@dataclass
+class BatchStats:
+    total: int = 0
+    skipped: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    fallbacks: int = 0
+    overloaded_retries: int = 0
+    qdrant_batches: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        processed = self.succeeded + self.failed + self.fallbacks
+        return (
+            f"prompts: {self.total}, skipped: {self.skipped}, "
+            f"succeeded: {self.succeeded}, failed: {self.failed}, "
+            f"attribute fallbacks (not written): {self.fallbacks}, "
+            f"overloaded retries: {self.overloaded_retries}, "
+            f"qdrant batches: {self.qdrant_batches}, elapsed: {elapsed:.1f}s, "
+            f"throughput: {processed / elapsed if elapsed else 0:.2f} prompts/s"
+        )
+
+
+def read_prompts(input_path: Path) -> List[Tuple[str, str]]:
+    """Read the (id, prompt) pairs of the input JSONL file.
+
+    Args:
+        input_path (Path): Path to the JSONL file of prompts.
+
+    Returns:
+        List[Tuple[str, str]]: The prompt IDs and prompts.
+    """
+    prompts = []
+    with open(input_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            prompts.append((str(record.get("id", line_number)), record["prompt"]))
+    return prompts
+
+
+def read_completed_ids(output_path: Path) -> Set[str]:
+    """Read the IDs of the prompts already in the output JSONL file.
+
+    A partially written last line, e.g. after a crash, is removed.
+
+    Args:
+        output_path (Path): Path to the output JSONL file.
+
+    Returns:
+        Set[str]: The IDs of the completed prompts.
+    """
+    if not output_path.exists():
+        return set()
+
+    with open(output_path, "rb+") as f:
+        content = f.read()
+        complete_length = content.rfind(b"\n") + 1
+        if complete_length < len(content):
+            f.truncate(complete_length)
+
+    return {
+        json.loads(line)["id"]
+        for line in content[:complete_length].decode("utf-8").splitlines()
+        if line.strip()
+    }
+
+
+def predict_state(prompt: str) -> Dict:
+    """Run the graph nodes up to the query vector for one prompt."""
+    state = {"user_query": prompt}
+    state.update(nodes.predict_attributes(state))
+    state.update(nodes.extract_attribute_vectors(state))
+    return state
+
+
+def search_similar_songs(states: List[Dict]) -> List[List[Dict]]:
+    """Run the similar songs search of several states in one Qdrant call."""
+    song_queries = [nodes.build_song_query(state) for state in states]
+    responses = nodes.client.query_batch_points(
+        collection_name=nodes.QDRANT_COLLECTION,
+        requests=[
+            models.QueryRequest(
+                query=state["query_vector"],
+                filter=song_query["query_filter"],
+                shard_key=song_query["shard_key_selector"],
+                limit=nodes.SIMILAR_SONGS_LIMIT,
+                with_payload=True,
+            )
+            for state, song_query in zip(states, song_queries)
+        ],
+    )
+    return [
+        nodes.handle_missing_track(
+            state, song_query["track_name"], response.model_dump()["points"]
+        )
+        for state, song_query, response in zip(states, song_queries, responses)
+    ]
+
+
+def to_result(prompt_id: str, prompt: str, state: Dict, similar_songs: List) -> Dict:
+    return {
+        "id": prompt_id,
+        "prompt": prompt,
+        "attributes": {
+            attribute: state.get(attribute)
+            for attribute in sorted(nodes.OVERRIDABLE_ATTRIBUTES)
+        },
+        "attributes_fallback": state.get("attributes_fallback", False),
+        "similar_songs": [
+            {**song["payload"], "score": song["score"]} for song in similar_songs
+        ],
+    }
+
+
+async def run_batch(
+    input_path: Path,
+    output_path: Path,
+    concurrency: int = 8,
+    batch_size: int = 32,
+    batch_wait_s: float = 0.5,
+) -> BatchStats:
+    """Run the prompts through the recommender and append the results.
+
+    The attributes are predicted for up to `concurrency` prompts at a time, and the
+    predicted prompts are searched in Qdrant in batches of up to `batch_size`.
+    Prompts whose attributes fell back to the priors are not written, as a resumed
+    run would treat them as completed. Prompts shed by the LLM admission control
+    are retried after its Retry-After delay rather than failed.
+
+    Args:
+        input_path (Path): Path to the JSONL file of prompts.
+        output_path (Path): Path to the JSONL file to append the results to.
+        concurrency (int, optional): Maximum number of prompts predicted at a time.
+            Defaults to 8.
+        batch_size (int, optional): Maximum number of queries per Qdrant call.
+            Defaults to 32.
+        batch_wait_s (float, optional): Maximum time to wait to fill a Qdrant batch.
+            Defaults to 0.5.
+
+    Returns:
+        BatchStats: Throughput and error statistics of the run.
+
+    Raises:
+        Exception: The error of the Qdrant search and output writer, e.g. if the
+            output cannot be written. The pending predictions are cancelled.
+    """
+    stats = BatchStats()
+    prompts = read_prompts(input_path)
+    completed_ids = read_completed_ids(output_path)
+    pending = [(id_, prompt) for id_, prompt in prompts if id_ not in completed_ids]
+    stats.total = len(prompts)
+    stats.skipped = len(prompts) - len(pending)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    predicted: asyncio.Queue = asyncio.Queue(maxsize=batch_size * 2)
+
+    async def predict(prompt_id: str, prompt: str) -> None:
+        async with semaphore:
+            while True:
+                try:
+                    state = await asyncio.to_thread(predict_state, prompt)
+                    break
+                except admission.OverloadedError as e:
+                    # More prompts in flight than the LLM capacity, or bound by
+                    # the tokens/min, so wait for capacity instead of failing
+                    stats.overloaded_retries += 1
+                    await asyncio.sleep(e.retry_after)
+                except Exception as e:
+                    logger.error(f"Prompt {prompt_id} failed: {e}")
+                    stats.failed += 1
+                    return
+        if state.get("attributes_fallback"):
+            logger.warning(f"Prompt {prompt_id} fell back to the attribute priors")
+            stats.fallbacks += 1
+            return
+        await predicted.put((prompt_id, prompt, state))
+
+    async def predict_all() -> None:
+        await asyncio.gather(*(predict(id_, prompt) for id_, prompt in pending))
+        # Signal the writer that all the prompts are predicted
+        await predicted.put(None)
+
+    async def search_and_write(output_file) -> None:
+        done = False
+        while not done:
+            batch = [await predicted.get()]
+            deadline = time.monotonic() + batch_wait_s
+            while len(batch) < batch_size:
+                try:
+                    batch.append(
+                        await asyncio.wait_for(
+                            predicted.get(), max(deadline - time.monotonic(), 0)
+                        )
+                    )
+                except asyncio.TimeoutError:
+                    break
+            if batch[-1] is None:
+                done = True
+                batch.pop()
+            if not batch:
+                continue
+
+            try:
+                results = await asyncio.to_thread(
+                    search_similar_songs, [state for _, _, state in batch]
+                )
+                stats.qdrant_batches += 1
+            except Exception as e:
+                logger.error(f"Qdrant batch of {len(batch)} prompts failed: {e}")
+                stats.failed += len(batch)
+                continue
+
+            for (prompt_id, prompt, state), similar_songs in zip(batch, results):
+                result = to_result(prompt_id, prompt, state, similar_songs)
+                output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                stats.succeeded += 1
+            output_file.flush()
+
+    with open(output_path, "a", encoding="utf-8") as output_file:
+        predictor = asyncio.create_task(predict_all())
+        writer = asyncio.create_task(search_and_write(output_file))
+        try:
+            # Raises as soon as the writer fails, instead of the predictions
+            # blocking forever on the full queue
+            await asyncio.gather(predictor, writer)
+        finally:
+            predictor.cancel()
+            writer.cancel()
+
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run natural-language prompts through the recommender in bulk."
+    )
+    parser.add_argument("input_path", type=Path, help="JSONL file of prompts")
+    parser.add_argument("output_path", type=Path, help="JSONL file of results")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--batch-wait", type=float, default=0.5)
+    args = parser.parse_args()
+
+    # Wait for the LLM instead of falling back to the attribute priors after the
+    # API's latency budget, which is meant for interactive requests
+    nodes.PREDICT_ATTRIBUTES_BUDGET_S = 0
+
+    stats = asyncio.run(
+        run_batch(
+            input_path=args.input_path,
+            output_path=args.output_path,
+            concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            batch_wait_s=args.batch_wait,
+        )
+    )
+    print(stats.report())
@@ -2,19 +2,50 @@ from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, START, END
 from rhythmix_model.recommender import nodes
 
-# Initialize the graph builder
-graph_builder = StateGraph(nodes.State)
 
-graph_builder.add_node("predict_attributes", nodes.predict_attributes)
-graph_builder.add_node("extract_attribute_vectors", nodes.extract_attribute_vectors)
-graph_builder.add_node("get_similar_songs", nodes.get_similar_songs)
-graph_builder.add_node("generate_llm_response", nodes.llm_response)
+def build_graph(
+    apply_overrides: bool = False, generate_response: bool = True
+) -> StateGraph:
+    """Build the recommender graph.
+
+    Args:
+        apply_overrides (bool, optional): Whether to apply the attribute_overrides
+            in the state right after the attributes prediction. Defaults to False.
+        generate_response (bool, optional): Whether to describe the similar songs
+            with the LLM. Otherwise the graph ends at get_similar_songs, saving an
+            LLM call when llm_response is not used. Defaults to True.
+
+    Returns:
+        StateGraph: The uncompiled graph.
+    """
+    graph_builder = StateGraph(nodes.State)
+
+    graph_builder.add_node("predict_attributes", nodes.predict_attributes)
+    graph_builder.add_node("extract_attribute_vectors", nodes.extract_attribute_vectors)
+    graph_builder.add_node("get_similar_songs", nodes.get_similar_songs)
+
+    graph_builder.add_edge(START, "predict_attributes")
+    if apply_overrides:
+        graph_builder.add_node(
+            "apply_attribute_overrides", nodes.apply_attribute_overrides
+        )
+        graph_builder.add_edge("predict_attributes", "apply_attribute_overrides")
+        graph_builder.add_edge("apply_attribute_overrides", "extract_attribute_vectors")
+    else:
+        graph_builder.add_edge("predict_attributes", "extract_attribute_vectors")
+    graph_builder.add_edge("extract_attribute_vectors", "get_similar_songs")
+    if generate_response:
+        graph_builder.add_node("generate_llm_response", nodes.llm_response)
+        graph_builder.add_edge("get_similar_songs", "generate_llm_response")
+        graph_builder.add_edge("generate_llm_response", END)
+    else:
+        graph_builder.add_edge("get_similar_songs", END)
 
-graph_builder.add_edge(START, "predict_attributes")
-graph_builder.add_edge("predict_attributes", "extract_attribute_vectors")
-graph_builder.add_edge("extract_attribute_vectors", "get_similar_songs")
-graph_builder.add_edge("get_similar_songs", "generate_llm_response")
-graph_builder.add_edge("generate_llm_response", END)
+    return graph_builder
+
+
+# Initialize the graph builder
+graph_builder = build_graph()
 
 # Set up Memory
 memory = MemorySaver()
@@ -23,3 +54,8 @@ memory = MemorySaver()
 compiled_graph = graph_builder.compile(
     checkpointer=memory, interrupt_after=["predict_attributes"]
 )
+
+# Single-shot variant without human-in-the-loop editing, so no checkpointer
+# or interrupt is needed. /recommend only returns the songs, so the LLM response
+# is skipped.
+oneshot_graph = build_graph(apply_overrides=True, generate_response=False).compile()
@@ -1,8 +1,10 @@
 import pandas as pd
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import TypedDict
+from typing import Optional, TypedDict
 import numpy as np
 from qdrant_client.http import models
 from qdrant_client import QdrantClient
@@ -11,9 +13,10 @@ from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers.string import StrOutputParser
 from langchain.output_parsers import PydanticOutputParser
 from rhythmix_model.recommender.validators import SongAttributes
-from rhythmix_model.recommender import prompts
+from rhythmix_model.recommender import admission, prompts, priors, resolver, shadow
 from conf import settings
 from dotenv import load_dotenv
+from loguru import logger
 
 load_dotenv()
 
@@ -22,9 +25,47 @@ QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 QDRANT_ENDPOINT = os.getenv("QDRANT_ENDPOINT")
 
 client = QdrantClient(url=QDRANT_ENDPOINT, api_key=QDRANT_API_KEY)
+
+# Collection serving the live queries, and the alternate collections a sample of
+# the live queries is replayed against for comparison
+QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "music_vectors")
+SIMILAR_SONGS_LIMIT = 5
+
+# Whether the live collection is sharded with one shard key per genre, see
+# create_vector_db. Genre-filtered queries are then routed to their genre's shards.
+QDRANT_SHARD_BY_GENRE = os.getenv("QDRANT_SHARD_BY_GENRE", "false").lower() == "true"
+shadow_queries = shadow.ShadowQueryRecorder(
+    client=client,
+    collections=[
+        collection_name
+        for collection_name in os.getenv("QDRANT_SHADOW_COLLECTIONS", "").split(",")
+        if collection_name and collection_name != QDRANT_COLLECTION
+    ],
+    sample_rate=float(os.getenv("QDRANT_SHADOW_SAMPLE_RATE", "0.0")),
+)
 df = pd.read_csv(Path(settings.DATA_DIR, "clean_data.csv"))
+catalog_resolver = resolver.CatalogResolver.from_dataframe(df)
+catalog_genres = set(df.track_genre.unique())
 llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
 
+# Latency budget for the attributes prediction before falling back to the
+# genre/artist priors. Set to 0 to always wait for the LLM.
+PREDICT_ATTRIBUTES_BUDGET_S = float(os.getenv("PREDICT_ATTRIBUTES_BUDGET_S", "5.0"))
+attribute_priors = priors.load_attribute_priors(
+    Path(settings.DATA_DIR, "attribute_priors.json")
+)
+# Admission control for the LLM calls, to stay within the OpenAI rate limits
+llm_admission = admission.AdmissionController(
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500")),
+    tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "64")),
+    max_wait_s=float(os.getenv("LLM_MAX_WAIT_S", "10.0")),
+)
+llm_executor = ThreadPoolExecutor(
+    max_workers=llm_admission.max_concurrency, thread_name_prefix="llm"
+)
+
 
 # Initialise the state graph
 class State(TypedDict):
@@ -32,6 +73,9 @@ class State(TypedDict):
     query_vector: np.array
     llm_response: str
     similar_songs: json
+    attributes_fallback: bool
+    attribute_overrides: dict
+    track_name: Optional[str]
     genre: str
     artists_list: list
     danceability: float
@@ -48,8 +92,48 @@ class State(TypedDict):
     time_signature: int
 
 
+# Attributes predicted by predict_attributes that the user can adjust
+OVERRIDABLE_ATTRIBUTES = {
+    "genre",
+    "artists_list",
+    "danceability",
+    "energy",
+    "key",
+    "loudness",
+    "mode",
+    "speechiness",
+    "acousticness",
+    "instrumentalness",
+    "liveness",
+    "valence",
+    "tempo",
+    "time_signature",
+}
+
+
+def _invoke_admitted(chain, inputs):
+    """Invokes the chain and frees its LLM admission slot once it completes"""
+    try:
+        return chain.invoke(inputs)
+    finally:
+        llm_admission.release()
+
+
+def _fallback_attributes(user_query: str):
+    """Predicts the attributes from the genre/artist priors instead of the LLM"""
+    return {
+        **priors.match_attribute_priors(attribute_priors, user_query),
+        "attributes_fallback": True,
+    }
+
+
 def predict_attributes(state: State):
-    """Takes the user_query and send it to the LLM for attributes prediction"""
+    """Takes the user_query and send it to the LLM for attributes prediction.
+
+    If the LLM is not admitted or does not answer within PREDICT_ATTRIBUTES_BUDGET_S,
+    the attributes are taken from the closest genre/artist prior and flagged as a
+    fallback.
+    """
     parser = PydanticOutputParser(pydantic_object=SongAttributes)
     prompt = PromptTemplate(
         template=prompts.QUERY_PROMPT,
@@ -59,11 +143,42 @@ def predict_attributes(state: State):
     chain = prompt | llm | parser
     list_of_genres = list(df.track_genre.unique())
 
-    pred_attributes = chain.invoke(
-        {"song_description": state["user_query"], "list_of_genres": list_of_genres}
+    inputs = {"song_description": state["user_query"], "list_of_genres": list_of_genres}
+    estimated_tokens = admission.estimate_tokens(
+        prompts.QUERY_PROMPT + state["user_query"] + str(list_of_genres),
+        completion_tokens=400,
     )
+    use_budget = attribute_priors is not None and PREDICT_ATTRIBUTES_BUDGET_S > 0
+    start = time.monotonic()
+
+    try:
+        llm_admission.acquire(
+            estimated_tokens,
+            max_wait_s=PREDICT_ATTRIBUTES_BUDGET_S if use_budget else None,
+        )
+    except admission.OverloadedError as e:
+        if not use_budget:
+            raise
+        logger.warning(f"{e}, falling back to the attribute priors")
+        return _fallback_attributes(state["user_query"])
+
+    future = llm_executor.submit(_invoke_admitted, chain, inputs)
+
+    if not use_budget:
+        pred_attributes = future.result()
+    else:
+        remaining_budget = PREDICT_ATTRIBUTES_BUDGET_S - (time.monotonic() - start)
+        try:
+            pred_attributes = future.result(timeout=max(remaining_budget, 0))
+        except TimeoutError:
+            logger.warning(
+                f"LLM did not respond within {PREDICT_ATTRIBUTES_BUDGET_S}s, "
+                "falling back to the attribute priors"
+            )
+            return _fallback_attributes(state["user_query"])
 
     return {
+        "attributes_fallback": False,
         "track_name": pred_attributes.track_name,
         "genre": pred_attributes.genre,
         "artists_list": pred_attributes.artists,
@@ -82,18 +197,34 @@ def predict_attributes(state: State):
     }
 
 
-def get_similar_songs(state: State):
-    """
+def apply_attribute_overrides(state: State):
+    """Overwrites the predicted attributes with the user's attribute_overrides"""
+    overrides = state.get("attribute_overrides") or {}
+    return {
+        attribute: value
+        for attribute, value in overrides.items()
+        if attribute in OVERRIDABLE_ATTRIBUTES
+    }
+
+
+def build_song_query(state: State) -> dict:
+    """Builds the filter and shard routing of the similar songs search.
+
     1. If track_name is known, filter your Qdrant collection by track_name.
-       If no matching record or your Qdrant database doesn't store track_name,
-       you can either short-circuit or fallback.
     2. Otherwise, if we have artists_list, filter by artist.
     3. Otherwise, filter by genre.
-    4. Run the Qdrant search and return similar_songs.
+
+    The names extracted by the LLM are first resolved to the catalog values.
+    Returns the resolved track_name, the query_filter and the shard_key_selector.
     """
 
     track_name = state.get("track_name", None)
 
+    # Map the names extracted by the LLM to the values stored in the catalog
+    if track_name:
+        track_name = catalog_resolver.resolve_track(track_name)
+    artists_list = catalog_resolver.resolve_artists(state["artists_list"] or [])
+
     if track_name:
         # Attempt filter by track_name
         filter_condition = models.Filter(
@@ -103,15 +234,15 @@ def get_similar_songs(state: State):
                 )
             ]
         )
-    elif state["artists_list"]:
+    elif artists_list:
         filter_condition = models.Filter(
             must=[
                 models.FieldCondition(
-                    key="track_artist", match=models.MatchAny(any=state["artists_list"])
+                    key="track_artist", match=models.MatchAny(any=artists_list)
                 )
             ]
         )
-    else:
+    elif state["genre"]:
         filter_condition = models.Filter(
             must=[
                 models.FieldCondition(
@@ -119,37 +250,88 @@ def get_similar_songs(state: State):
                 )
             ]
         )
+    else:
+        # The attribute priors fallback may not match any genre
+        filter_condition = None
 
-    similar_songs_response = client.query_points(
-        collection_name="music_vectors",
-        query=state["query_vector"],
-        limit=5,
-        with_payload=True,
-        query_filter=filter_condition,
-    )
+    # Route genre-filtered queries to the genre's shard key, and fan out the
+    # track and artist queries, which can span genres, to all the shards
+    shard_key_selector = None
+    if (
+        QDRANT_SHARD_BY_GENRE
+        and not track_name
+        and not artists_list
+        and state["genre"] in catalog_genres
+    ):
+        shard_key_selector = state["genre"]
+
+    return {
+        "track_name": track_name,
+        "query_filter": filter_condition,
+        "shard_key_selector": shard_key_selector,
+    }
 
-    similar_songs = similar_songs_response.model_dump()["points"]
+
+def handle_missing_track(state: State, track_name: str, similar_songs: list) -> list:
+    """Returns a placeholder song if the requested track_name has no Qdrant hits"""
 
     # If you want to handle the case where track_name was given,
     # but no Qdrant hits are found (similar_songs is empty),
     # you could fallback to the attribute-based approach here:
     if track_name and not similar_songs:
         # For instance, short-circuit with a single placeholder record
-        return {
-            "similar_songs": [
-                {
-                    "payload": {
-                        "track_name": track_name,
-                        "track_artist": state.get("artists_list", []),
-                        "track_genre": state.get("genre", "N/A"),
-                        "track_link": "N/A",
-                    },
-                    "score": 1.0,
-                }
-            ]
-        }
+        return [
+            {
+                "payload": {
+                    "track_name": track_name,
+                    "track_artist": state.get("artists_list", []),
+                    "track_genre": state.get("genre", "N/A"),
+                    "track_link": "N/A",
+                },
+                "score": 1.0,
+            }
+        ]
 
-    return {"similar_songs": similar_songs}
+    return similar_songs
+
+
+def get_similar_songs(state: State):
+    """
+    1. Build the Qdrant filter from the track_name, artists_list or genre.
+    2. Run the Qdrant search and return similar_songs.
+       If the track_name has no matching record, short-circuit with a placeholder.
+    """
+
+    song_query = build_song_query(state)
+
+    start = time.perf_counter()
+    similar_songs_response = client.query_points(
+        collection_name=QDRANT_COLLECTION,
+        query=state["query_vector"],
+        limit=SIMILAR_SONGS_LIMIT,
+        with_payload=True,
+        query_filter=song_query["query_filter"],
+        shard_key_selector=song_query["shard_key_selector"],
+    )
+    latency = time.perf_counter() - start
+
+    similar_songs = similar_songs_response.model_dump()["points"]
+
+    # Replay a sample of the queries against the shadow collections in the background
+    shadow_queries.maybe_shadow(
+        query=state["query_vector"],
+        query_filter=song_query["query_filter"],
+        limit=SIMILAR_SONGS_LIMIT,
+        primary_points=similar_songs,
+        primary_latency_s=latency,
+        shard_key_selector=song_query["shard_key_selector"],
+    )
+
+    return {
+        "similar_songs": handle_missing_track(
+            state, song_query["track_name"], similar_songs
+        )
+    }
 
 
 def extract_attribute_vectors(state: State):
@@ -176,11 +358,24 @@ def extract_attribute_vectors(state: State):
 
 
 def llm_response(state: State):
+    """Describes the similar songs with the LLM.
+
+    The description is optional, so it is skipped rather than failing the request
+    when the LLM is overloaded.
+    """
     parser = StrOutputParser()
     prompt = PromptTemplate(
         template=prompts.RESPONSE_PROMPT,
         input_variables=["model_prediction"],
     )
     chain = prompt | llm | parser
-    llm_response = chain.invoke({"model_prediction": state["similar_songs"]})
+    estimated_tokens = admission.estimate_tokens(
+        prompts.RESPONSE_PROMPT + str(state["similar_songs"]), completion_tokens=1000
+    )
+    try:
+        with llm_admission.admit(estimated_tokens):
+            llm_response = chain.invoke({"model_prediction": state["similar_songs"]})
+    except admission.OverloadedError as e:
+        logger.warning(f"{e}, skipping the LLM response")
+        return {}
     return {"llm_response": llm_response}
@@ -0,0 +1,82 @@
+from typing import Dict, Iterable, List
+
+import numpy as np
+from qdrant_client.http import models
+
+from rhythmix_model.recommender import nodes
+
+# Point IDs are the row index of the catalog at ingestion
+track_point_ids = dict(zip(nodes.df.track_id, nodes.df.index))
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale every row to unit length so that dot products are cosine similarities."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def continue_playlist(
+    seed_track_ids: List[str],
+    played_track_ids: Iterable[str] = (),
+    limit: int = 10,
+    candidate_multiplier: int = 4,
+) -> List[Dict]:
+    """Recommend tracks that continue a playlist of seed tracks.
+
+    The stored vectors of all seeds are fetched in one call and their centroid is
+    used as the query. The candidates are then re-ranked by their mean cosine
+    similarity to every seed, computed as a single matrix product.
+
+    Args:
+        seed_track_ids (List[str]): Spotify track IDs of the playlist so far.
+        played_track_ids (Iterable[str], optional): Track IDs to exclude in addition
+            to the seeds. Defaults to ().
+        limit (int, optional): Number of tracks to return. Defaults to 10.
+        candidate_multiplier (int, optional): How many candidates per returned track
+            to fetch from Qdrant for re-ranking. Defaults to 4.
+
+    Returns:
+        List[Dict]: The recommended songs, each with "payload" and "score" keys.
+    """
+    point_ids = [
+        int(track_point_ids[track_id])
+        for track_id in seed_track_ids
+        if track_id in track_point_ids
+    ]
+    if not point_ids:
+        return []
+
+    seeds = nodes.client.retrieve(
+        collection_name=nodes.QDRANT_COLLECTION,
+        ids=point_ids,
+        with_payload=False,
+        with_vectors=True,
+    )
+    seed_vectors = np.array([seed.vector for seed in seeds], dtype=float)
+
+    # Exclude the seeds and the already played tracks server-side
+    excluded_track_ids = sorted(set(seed_track_ids) | set(played_track_ids))
+    candidates = nodes.client.query_points(
+        collection_name=nodes.QDRANT_COLLECTION,
+        query=seed_vectors.mean(axis=0).tolist(),
+        limit=limit * candidate_multiplier,
+        with_payload=True,
+        with_vectors=True,
+        query_filter=models.Filter(
+            must_not=[
+                models.FieldCondition(
+                    key="track_id", match=models.MatchAny(any=excluded_track_ids)
+                )
+            ]
+        ),
+    ).points
+    if not candidates:
+        return []
+
+    candidate_vectors = np.array([point.vector for point in candidates], dtype=float)
+    scores = (_unit_rows(candidate_vectors) @ _unit_rows(seed_vectors).T).mean(axis=1)
+
+    return [
+        {"payload": candidates[idx].payload, "score": float(scores[idx])}
+        for idx in np.argsort(-scores, kind="stable")[:limit]
+    ]
@@ -0,0 +1,92 @@
+import os
+from typing import Dict, List
+
+from rhythmix_model.recommender import nodes
+
+# Maximum difference between the prefetched and the final attributes, as a
+# fraction of each attribute's range, for the prefetched songs to be reused
+PREFETCH_TOLERANCE = float(os.getenv("PREFETCH_TOLERANCE", "0.02"))
+
+# Range of the continuous attributes, as described to the LLM in the prompt
+ATTRIBUTE_RANGES = {
+    "danceability": 1.0,
+    "energy": 1.0,
+    "loudness": 55.0,
+    "speechiness": 1.0,
+    "acousticness": 1.0,
+    "instrumentalness": 1.0,
+    "liveness": 1.0,
+    "valence": 1.0,
+    "tempo": 250.0,
+}
+
+# Attributes that feed the Qdrant filter of build_song_query or are discrete
+# must match exactly
+EXACT_ATTRIBUTES = [
+    "track_name",
+    "genre",
+    "artists_list",
+    "key",
+    "mode",
+    "time_signature",
+]
+
+# Attributes compared by attributes_match. Songs prefetched for other attributes
+# cannot be reused.
+COMPARED_ATTRIBUTES = set(EXACT_ATTRIBUTES) | set(ATTRIBUTE_RANGES)
+
+
+def search_similar_songs(attributes: Dict) -> List[Dict]:
+    """Run the Qdrant search of the graph for the given attributes.
+
+    The search is not sampled into the shadow queries, as it is speculative and
+    the songs are discarded if the user changes the attributes.
+
+    Args:
+        attributes (Dict): The graph state after predict_attributes.
+
+    Returns:
+        List[Dict]: The similar songs, as returned by the get_similar_songs node.
+    """
+    state = {**attributes, **nodes.extract_attribute_vectors(attributes)}
+    song_query = nodes.build_song_query(state)
+    response = nodes.client.query_points(
+        collection_name=nodes.QDRANT_COLLECTION,
+        query=state["query_vector"],
+        limit=nodes.SIMILAR_SONGS_LIMIT,
+        with_payload=True,
+        query_filter=song_query["query_filter"],
+        shard_key_selector=song_query["shard_key_selector"],
+    )
+    return nodes.handle_missing_track(
+        state, song_query["track_name"], response.model_dump()["points"]
+    )
+
+
+def attributes_match(
+    prefetched: Dict, updated: Dict, tolerance: float = PREFETCH_TOLERANCE
+) -> bool:
+    """Check whether the songs prefetched for some attributes can be reused.
+
+    Attributes outside COMPARED_ATTRIBUTES are ignored, so the caller must not
+    reuse the songs if the user changed any of them.
+
+    Args:
+        prefetched (Dict): The attributes the songs were prefetched for.
+        updated (Dict): The final attributes adjusted by the user.
+        tolerance (float, optional): Maximum difference of the continuous attributes,
+            as a fraction of their range. Defaults to PREFETCH_TOLERANCE.
+
+    Returns:
+        bool: True if the attributes match within the tolerance.
+    """
+    for attribute in EXACT_ATTRIBUTES:
+        if prefetched.get(attribute) != updated.get(attribute):
+            return False
+
+    for attribute, attribute_range in ATTRIBUTE_RANGES.items():
+        difference = abs(float(prefetched[attribute]) - float(updated[attribute]))
+        if difference > tolerance * attribute_range:
+            return False
+
+    return True
@@ -0,0 +1,98 @@
+import json
+from pathlib import Path
+from typing import Dict, Optional
+
+from rhythmix_model.recommender.resolver import normalise
+
+INTEGER_ATTRIBUTES = {"key", "mode", "time_signature"}
+
+
+def _normalise(text: str) -> str:
+    """Normalise the text and pad it with spaces for whole-word matching.
+
+    Hyphens are stripped like the other punctuation, so that the catalog genre
+    "deep-house" matches "deep house" in the prompt.
+    """
+    return f" {normalise(text)} "
+
+
+def _is_strong_artist_match(name: str) -> bool:
+    """Check whether an artist matched in the prompt is unlikely to be a common word.
+
+    Only multi-word names are strong matches. Single-word names, such as "Low" or
+    "Love", are as likely to be part of the description, whatever their casing.
+    """
+    return len(normalise(name).split()) > 1
+
+
+def load_attribute_priors(priors_path: Path) -> Optional[Dict]:
+    """Load the attribute priors lookup table created during ingestion.
+
+    Args:
+        priors_path (Path): Path to the attribute priors JSON file.
+
+    Returns:
+        Optional[Dict]: The attribute priors, or None if the file does not exist.
+    """
+    if not priors_path.exists():
+        return None
+
+    with open(priors_path, encoding="utf-8") as f:
+        priors = json.load(f)
+
+    # Precompute the normalised names used for matching against the prompt.
+    # Longer names are matched first so that "deep-house" wins over "house".
+    for group in ("genre", "artist"):
+        priors[f"{group}_names"] = sorted(
+            ((_normalise(name), name) for name in priors[group]),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+
+    return priors
+
+
+def match_attribute_priors(priors: Dict, user_query: str) -> Dict:
+    """Predict the song attributes from the closest artist or genre prior.
+
+    Artists mentioned in the query take precedence over genres, and the global
+    prior is used if neither is mentioned. Weak artist matches, i.e. single-word
+    names that may be common words, only pick the attributes when no genre is
+    mentioned. Neither their name nor their genre is returned, as both filter the
+    Qdrant search.
+
+    Args:
+        priors (Dict): Attribute priors from load_attribute_priors.
+        user_query (str): The user's description of the song.
+
+    Returns:
+        Dict: The predicted attributes in the same format as the predict_attributes node.
+    """
+    query = _normalise(user_query)
+
+    matched_artists = [name for key, name in priors["artist_names"] if key in query]
+    artists = [name for name in matched_artists if _is_strong_artist_match(name)]
+    genre = next((name for key, name in priors["genre_names"] if key in query), None)
+
+    if artists:
+        prior = priors["artist"][artists[0]]
+        genre = genre or prior["genre"]
+    elif genre:
+        prior = priors["genre"][genre]
+    elif matched_artists:
+        prior = priors["artist"][matched_artists[0]]
+    else:
+        prior = priors["global"]
+
+    attributes = {}
+    for attribute, value in zip(priors["attributes"], prior["median"]):
+        attributes[attribute] = (
+            int(round(value)) if attribute in INTEGER_ATTRIBUTES else value
+        )
+
+    return {
+        "track_name": None,
+        "genre": genre,
+        "artists_list": artists,
+        **attributes,
+    }
@@ -0,0 +1,192 @@
+import bisect
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Literal, Optional, Set
+
+import pandas as pd
+
+PUNCTUATION = re.compile(r"[^\w\s]|_")
+# Punctuation inside a word is deleted rather than split on, so that "Don't"
+# matches "Dont", "AC/DC" matches "ACDC" and "P!nk" matches "Pnk"
+INTRA_WORD_PUNCTUATION = re.compile(r"(?<=\w)['’./!](?=\w)")
+
+
+def normalise(text: str) -> str:
+    """Casefold the text, strip accents and punctuation, and collapse whitespace.
+
+    Args:
+        text (str): Free-text artist or track name.
+
+    Returns:
+        str: The normalised text, e.g. "Beyoncé - Halo!" becomes "beyonce halo" and
+        "Don't Stop Believin'" becomes "dont stop believin".
+    """
+    decomposed = unicodedata.normalize("NFKD", str(text).casefold())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    joined = INTRA_WORD_PUNCTUATION.sub("", stripped)
+    return " ".join(PUNCTUATION.sub(" ", joined).split())
+
+
+class _NameIndex:
+    """Exact, token and prefix lookups over one set of catalog names."""
+
+    def __init__(self, names: Dict[str, Set[str]]):
+        # normalised name -> canonical name and the stored values it maps to
+        self.canonical: Dict[str, str] = {}
+        self.values: Dict[str, Set[str]] = {}
+        for name, values in names.items():
+            key = normalise(name)
+            if not key:
+                continue
+            self.canonical.setdefault(key, name)
+            self.values.setdefault(key, set()).update(values)
+
+        self.tokens: Dict[str, Set[str]] = defaultdict(set)
+        for key in self.canonical:
+            for token in key.split():
+                self.tokens[token].add(key)
+
+        self.sorted_keys: List[str] = sorted(self.canonical)
+
+    def lookup(self, text: str, min_overlap: float) -> Optional[str]:
+        """Return the normalised key that best matches the text.
+
+        Candidates containing all the query tokens are preferred over those with a
+        higher Jaccard overlap. A tie between the best candidates is ambiguous,
+        e.g. "Taylor" for "Taylor Swift" and "James Taylor", so None is returned.
+        """
+        key = normalise(text)
+        if key in self.canonical:
+            return key
+
+        query_tokens = set(key.split())
+        if not query_tokens:
+            return None
+
+        # Score the candidates sharing a token by their Jaccard overlap
+        candidates: Dict[str, int] = defaultdict(int)
+        for token in query_tokens:
+            for candidate in self.tokens.get(token, ()):
+                candidates[candidate] += 1
+
+        ranked = sorted(
+            (
+                (
+                    shared == len(query_tokens),
+                    shared / len(query_tokens | set(candidate.split())),
+                ),
+                candidate,
+            )
+            for candidate, shared in candidates.items()
+        )
+        if not ranked:
+            return None
+
+        (contains_all, best_score), best_key = ranked[-1]
+        if len(ranked) > 1 and ranked[-2][0] == (contains_all, best_score):
+            return None
+        return best_key if best_score >= min_overlap else None
+
+    def complete(self, prefix: str, limit: int) -> List[str]:
+        """Return the normalised keys starting with the prefix."""
+        prefix = normalise(prefix)
+        if not prefix:
+            return []
+
+        start = bisect.bisect_left(self.sorted_keys, prefix)
+        matches = []
+        for key in self.sorted_keys[start:]:
+            if not key.startswith(prefix) or len(matches) >= limit:
+                break
+            matches.append(key)
+        return matches
+
+
+class CatalogResolver:
+    """Resolves free-text artist and track names to canonical catalog values.
+
+    Artists are indexed individually, so that "Taylor Swift" resolves to every
+    stored track_artist value featuring her, e.g. "Taylor Swift;Ed Sheeran".
+    """
+
+    def __init__(self, artists: Dict[str, Set[str]], tracks: Dict[str, Set[str]]):
+        self.artists = _NameIndex(artists)
+        self.tracks = _NameIndex(tracks)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "CatalogResolver":
+        """Build the resolver from the catalog.
+
+        Args:
+            df (pd.DataFrame): Catalog with the "artists" and "track_name" columns.
+
+        Returns:
+            CatalogResolver: The resolver over the catalog's artists and tracks.
+        """
+        df_names = df.loc[:, ["artists", "track_name"]].dropna()
+
+        artists: Dict[str, Set[str]] = defaultdict(set)
+        for track_artist in df_names["artists"].unique():
+            for artist in track_artist.split(";"):
+                artists[artist.strip()].add(track_artist)
+
+        tracks: Dict[str, Set[str]] = defaultdict(set)
+        for track_name in df_names["track_name"].unique():
+            tracks[track_name].add(track_name)
+
+        return cls(artists=artists, tracks=tracks)
+
+    def resolve_artists(
+        self, artists: List[str], min_overlap: float = 0.5
+    ) -> List[str]:
+        """Map free-text artist names to the stored track_artist values.
+
+        Args:
+            artists (List[str]): Artist names, e.g. as extracted by the LLM.
+            min_overlap (float, optional): Minimum token overlap for a fuzzy match.
+                Defaults to 0.5.
+
+        Returns:
+            List[str]: The track_artist values featuring any of the artists.
+            Unresolved artists are kept as given.
+        """
+        values = set()
+        for artist in artists:
+            key = self.artists.lookup(artist, min_overlap)
+            if key is None:
+                values.add(artist)
+            else:
+                values.update(self.artists.values[key])
+        return sorted(values)
+
+    def resolve_track(self, track_name: str, min_overlap: float = 0.5) -> str:
+        """Map a free-text track name to the stored track_name value.
+
+        Args:
+            track_name (str): Track name, e.g. as extracted by the LLM.
+            min_overlap (float, optional): Minimum token overlap for a fuzzy match.
+                Defaults to 0.5.
+
+        Returns:
+            str: The canonical track name, or the track name as given if unresolved.
+        """
+        key = self.tracks.lookup(track_name, min_overlap)
+        return track_name if key is None else self.tracks.canonical[key]
+
+    def autocomplete(
+        self, prefix: str, kind: Literal["artist", "track"] = "artist", limit: int = 10
+    ) -> List[str]:
+        """Suggest canonical artist or track names starting with the prefix.
+
+        Args:
+            prefix (str): The text typed so far.
+            kind (Literal["artist", "track"], optional): Names to suggest.
+                Defaults to "artist".
+            limit (int, optional): Maximum number of suggestions. Defaults to 10.
+
+        Returns:
+            List[str]: The canonical names in alphabetical order.
+        """
+        index = self.artists if kind == "artist" else self.tracks
+        return [index.canonical[key] for key in index.complete(prefix, limit)]
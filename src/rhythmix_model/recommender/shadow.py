@@ -0,0 +1,176 @@
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+
+def _percentile(values, percentile: float) -> Optional[float]:
+    return float(np.percentile(values, percentile)) if values else None
+
+
+def _mean(values) -> Optional[float]:
+    return float(np.mean(values)) if values else None
+
+
+class ShadowQueryRecorder:
+    """Replays a sample of the live queries against alternate collections.
+
+    The shadow queries run in a background thread pool after the live query has
+    returned, so they add no latency to the request. For every shadow collection
+    the latency, the top-k overlap with the live results and the distribution of
+    the top-k scores are recorded over a sliding window.
+
+    Args:
+        client (QdrantClient): Qdrant client instance.
+        collections (List[str]): Collections to shadow the live queries to.
+        sample_rate (float): Fraction of the live queries to shadow.
+        max_pending (int, optional): Maximum number of shadow queries waiting to
+            run. Further samples are dropped. Defaults to 16.
+        window (int, optional): Number of samples kept per collection. Defaults to 1000.
+    """
+
+    def __init__(
+        self,
+        client: QdrantClient,
+        collections: List[str],
+        sample_rate: float,
+        max_pending: int = 16,
+        window: int = 1000,
+    ):
+        self.client = client
+        self.collections = collections
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._dropped = 0
+        self._errors = defaultdict(int)
+        self._primary_latency = deque(maxlen=window)
+        self._latency = defaultdict(lambda: deque(maxlen=window))
+        self._overlap = defaultdict(lambda: deque(maxlen=window))
+        self._scores = defaultdict(lambda: deque(maxlen=window))
+
+    def maybe_shadow(
+        self,
+        query: List[float],
+        query_filter: Optional[models.Filter],
+        limit: int,
+        primary_points: List[Dict],
+        primary_latency_s: float,
+        shard_key_selector: Optional[str] = None,
+    ) -> None:
+        """Sample the live query and, if sampled, submit it to the shadow collections.
+
+        Args:
+            query (List[float]): The query vector of the live query.
+            query_filter (Optional[models.Filter]): The filter of the live query.
+            limit (int): The number of results of the live query.
+            primary_points (List[Dict]): The results of the live query.
+            primary_latency_s (float): The latency of the live query.
+            shard_key_selector (str, optional): The shard key the live query was
+                routed to, so that the shadow queries touch the same shards.
+                Defaults to None for all the shards.
+        """
+        if not self.collections or random.random() >= self.sample_rate:
+            return
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._dropped += 1
+                return
+            self._pending += 1
+
+        self._executor.submit(
+            self._run,
+            query,
+            query_filter,
+            limit,
+            [point["payload"]["track_id"] for point in primary_points],
+            primary_latency_s,
+            shard_key_selector,
+        )
+
+    def _run(
+        self,
+        query: List[float],
+        query_filter: Optional[models.Filter],
+        limit: int,
+        primary_track_ids: List[str],
+        primary_latency_s: float,
+        shard_key_selector: Optional[str],
+    ) -> None:
+        try:
+            with self._lock:
+                self._primary_latency.append(primary_latency_s)
+
+            for collection_name in self.collections:
+                try:
+                    start = time.perf_counter()
+                    points = self.client.query_points(
+                        collection_name=collection_name,
+                        query=query,
+                        limit=limit,
+                        with_payload=["track_id"],
+                        query_filter=query_filter,
+                        shard_key_selector=shard_key_selector,
+                    ).points
+                    latency = time.perf_counter() - start
+                except Exception as e:
+                    logger.warning(f"Shadow query to {collection_name} failed: {e}")
+                    with self._lock:
+                        self._errors[collection_name] += 1
+                    continue
+
+                shadow_track_ids = {point.payload["track_id"] for point in points}
+                overlap = len(shadow_track_ids.intersection(primary_track_ids)) / max(
+                    len(primary_track_ids), 1
+                )
+                with self._lock:
+                    self._latency[collection_name].append(latency)
+                    self._overlap[collection_name].append(overlap)
+                    self._scores[collection_name].extend(
+                        point.score for point in points
+                    )
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> Dict:
+        """Latency, top-k overlap and score distribution per shadow collection."""
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "pending": self._pending,
+                "dropped": self._dropped,
+                "primary": {
+                    "samples": len(self._primary_latency),
+                    "latency_p50_s": _percentile(self._primary_latency, 50),
+                    "latency_p95_s": _percentile(self._primary_latency, 95),
+                },
+                "shadow": {
+                    collection_name: {
+                        "samples": len(self._latency[collection_name]),
+                        "errors": self._errors[collection_name],
+                        "latency_p50_s": _percentile(
+                            self._latency[collection_name], 50
+                        ),
+                        "latency_p95_s": _percentile(
+                            self._latency[collection_name], 95
+                        ),
+                        "overlap_mean": _mean(self._overlap[collection_name]),
+                        "score_mean": _mean(self._scores[collection_name]),
+                        "score_p5": _percentile(self._scores[collection_name], 5),
+                        "score_p95": _percentile(self._scores[collection_name], 95),
+                    }
+                    for collection_name in self.collections
+                },
+            }
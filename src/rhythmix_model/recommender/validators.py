@@ -1,5 +1,5 @@
 from typing import List, Optional
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 class SongAttributes(BaseModel):
@@ -58,3 +58,27 @@ class SongAttributes(BaseModel):
         if value < 0:
             raise ValueError("Tempo should be greater than 0")
         return value
+
+
+class AttributeOverrides(BaseModel):
+    """Attributes the user sets instead of the predicted ones. Unset attributes
+    keep their predicted values, and unknown attributes are rejected."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    genre: Optional[str] = Field(default=None, description="The genre of the song")
+    artists_list: Optional[List[str]] = Field(
+        default=None, description="The preferred artists of the recommended songs"
+    )
+    danceability: Optional[float] = Field(default=None, ge=0, le=1)
+    energy: Optional[float] = Field(default=None, ge=0, le=1)
+    key: Optional[int] = Field(default=None, ge=0, le=11)
+    loudness: Optional[float] = None
+    mode: Optional[int] = Field(default=None, ge=0, le=1)
+    speechiness: Optional[float] = Field(default=None, ge=0, le=1)
+    acousticness: Optional[float] = Field(default=None, ge=0, le=1)
+    instrumentalness: Optional[float] = Field(default=None, ge=0, le=1)
+    liveness: Optional[float] = Field(default=None, ge=0, le=1)
+    valence: Optional[float] = Field(default=None, ge=0, le=1)
+    tempo: Optional[float] = Field(default=None, ge=0)
+    time_signature: Optional[int] = None
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+from rhythmix_model.recommender.admission import (
+    AdmissionController,
+    OverloadedError,
+    TokenBucket,
+)
+
+
+def make_controller(**kwargs) -> AdmissionController:
+    params = {
+        "max_concurrency": 1,
+        "requests_per_minute": 0,
+        "tokens_per_minute": 0,
+        "max_queue": 8,
+        "max_wait_s": 1.0,
+    }
+    params.update(kwargs)
+    return AdmissionController(**params)
+
+
+def wait_for_queue_depth(controller: AdmissionController, depth: int) -> None:
+    deadline = time.monotonic() + 5
+    while controller.stats()["queue_depth"] < depth:
+        assert time.monotonic() < deadline, "caller never queued"
+        time.sleep(0.001)
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(per_minute=60)
+    bucket.updated = 0.0
+
+    bucket.consume(60)
+    assert bucket.wait_time(1, now=0.0) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now=0.5) == pytest.approx(0.5)
+    assert bucket.wait_time(1, now=1.0) == 0.0
+
+    # Idle time never refills past the capacity
+    assert bucket.wait_time(60, now=1000.0) == 0.0
+    assert bucket.tokens == 60
+
+
+def test_token_bucket_caps_requests_larger_than_capacity():
+    bucket = TokenBucket(per_minute=60)
+    bucket.updated = 0.0
+
+    assert bucket.wait_time(600, now=0.0) == 0.0
+    bucket.consume(600)
+    assert bucket.tokens == 0
+
+
+def test_token_bucket_disabled_with_zero_rate():
+    bucket = TokenBucket(per_minute=0)
+
+    bucket.consume(1000)
+    assert bucket.wait_time(1000, now=time.monotonic()) == 0.0
+
+
+def test_admits_up_to_max_concurrency():
+    controller = make_controller(max_concurrency=2)
+
+    controller.acquire(estimated_tokens=10)
+    controller.acquire(estimated_tokens=10)
+
+    stats = controller.stats()
+    assert stats["in_flight"] == 2
+    assert stats["admitted"] == 2
+
+
+def test_sheds_when_queue_is_full():
+    controller = make_controller(max_queue=1, max_wait_s=5.0)
+    controller.acquire(estimated_tokens=10)
+
+    # Fill the queue with a caller waiting for the concurrency slot
+    waiter = threading.Thread(target=controller.acquire, args=(10,))
+    waiter.start()
+    wait_for_queue_depth(controller, 1)
+
+    with pytest.raises(OverloadedError, match="queue full"):
+        controller.acquire(estimated_tokens=10)
+
+    controller.release()
+    waiter.join(timeout=5)
+    assert controller.stats()["admitted"] == 2
+    assert controller.stats()["shed"] == 1
+
+
+def test_sheds_when_deadline_is_exceeded():
+    controller = make_controller(max_wait_s=5.0)
+    controller.acquire(estimated_tokens=10)
+
+    start = time.monotonic()
+    with pytest.raises(OverloadedError, match="deadline exceeded"):
+        controller.acquire(estimated_tokens=10, max_wait_s=0.05)
+
+    assert 0.05 <= time.monotonic() - start < 1.0
+    assert controller.stats()["queue_depth"] == 0
+
+
+def test_sheds_right_away_when_rate_limit_outlasts_deadline():
+    controller = make_controller(max_concurrency=8, requests_per_minute=1)
+    controller.acquire(estimated_tokens=10)
+
+    start = time.monotonic()
+    with pytest.raises(OverloadedError) as exc_info:
+        controller.acquire(estimated_tokens=10, max_wait_s=5.0)
+
+    assert time.monotonic() - start < 1.0
+    # The next request is only available once the bucket refilled
+    assert exc_info.value.retry_after == 60
+
+
+def test_release_admits_waiting_caller():
+    controller = make_controller(max_wait_s=5.0)
+    controller.acquire(estimated_tokens=10)
+
+    waiter = threading.Thread(target=controller.acquire, args=(10,))
+    waiter.start()
+    wait_for_queue_depth(controller, 1)
+    controller.release()
+    waiter.join(timeout=5)
+
+    stats = controller.stats()
+    assert not waiter.is_alive()
+    assert stats["in_flight"] == 1
+    assert stats["shed"] == 0
+
+
+def test_admit_releases_slot_on_error():
+    controller = make_controller()
+
+    with pytest.raises(RuntimeError):
+        with controller.admit(estimated_tokens=10):
+            raise RuntimeError("LLM call failed")
+
+    assert controller.stats()["in_flight"] == 0
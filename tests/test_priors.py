@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from rhythmix_model.recommender.priors import (
+    load_attribute_priors,
+    match_attribute_priors,
+)
+
+
+def make_prior(energy: float, genre: str = None) -> dict:
+    prior = {"count": 10, "mean": [energy, 5.0], "median": [energy, 5.0]}
+    if genre:
+        prior["genre"] = genre
+    return prior
+
+
+@pytest.fixture
+def priors(tmp_path):
+    priors_path = tmp_path / "attribute_priors.json"
+    priors_path.write_text(
+        json.dumps(
+            {
+                "attributes": ["energy", "key"],
+                "global": make_prior(0.5),
+                "genre": {
+                    "house": make_prior(0.7),
+                    "deep-house": make_prior(0.6),
+                    "hip-hop": make_prior(0.8),
+                    "rock": make_prior(0.9),
+                },
+                "artist": {
+                    "Drake": make_prior(0.65, genre="hip-hop"),
+                    "Beyoncé": make_prior(0.75, genre="pop"),
+                    "Low": make_prior(0.2, genre="indie"),
+                    "Love": make_prior(0.85, genre="rock"),
+                    "Taylor Swift": make_prior(0.55, genre="pop"),
+                },
+            }
+        ),
+        encoding="utf-8",
+    )
+    return load_attribute_priors(priors_path)
+
+
+def test_missing_priors_file(tmp_path):
+    assert load_attribute_priors(tmp_path / "missing.json") is None
+
+
+def test_hyphenated_genre_matches_spelled_out_genre(priors):
+    attributes = match_attribute_priors(priors, "some deep house for the evening")
+
+    assert attributes["genre"] == "deep-house"
+    assert attributes["energy"] == 0.6
+    assert match_attribute_priors(priors, "Hip hop, please")["genre"] == "hip-hop"
+
+
+def test_longer_genre_wins_over_contained_genre(priors):
+    assert match_attribute_priors(priors, "deep-house")["genre"] == "deep-house"
+    assert match_attribute_priors(priors, "house")["genre"] == "house"
+
+
+def test_multi_word_artist_is_returned(priors):
+    attributes = match_attribute_priors(priors, "something by taylor swift!")
+
+    assert attributes["artists_list"] == ["Taylor Swift"]
+    assert attributes["genre"] == "pop"
+    assert attributes["energy"] == 0.55
+
+
+def test_single_word_artist_does_not_filter(priors):
+    for query in [
+        "songs like Drake.",
+        "Love songs for a rainy day",
+        "Give me Beyoncé!",
+    ]:
+        attributes = match_attribute_priors(priors, query)
+        assert attributes["artists_list"] == []
+        assert attributes["genre"] is None
+
+    # The weak match still picks the attributes
+    assert match_attribute_priors(priors, "songs like Drake.")["energy"] == 0.65
+
+
+def test_genre_wins_over_single_word_artist(priors):
+    attributes = match_attribute_priors(priors, "a low energy house track")
+
+    assert attributes["artists_list"] == []
+    assert attributes["genre"] == "house"
+    assert attributes["energy"] == 0.7
+
+
+def test_global_prior_without_match(priors):
+    attributes = match_attribute_priors(priors, "anything upbeat")
+
+    assert attributes == {
+        "track_name": None,
+        "genre": None,
+        "artists_list": [],
+        "energy": 0.5,
+        "key": 5,
+    }
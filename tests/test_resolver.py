@@ -0,0 +1,90 @@
+import pandas as pd
+import pytest
+
+from rhythmix_model.recommender.resolver import CatalogResolver, normalise
+
+
+@pytest.fixture
+def resolver() -> CatalogResolver:
+    df = pd.DataFrame(
+        {
+            "artists": [
+                "Taylor Swift",
+                "Taylor Swift;Ed Sheeran",
+                "James Taylor",
+                "Beyoncé",
+                "AC/DC",
+                "Journey",
+                "Tayla",
+            ],
+            "track_name": [
+                "Love Story",
+                "End Game",
+                "Fire and Rain",
+                "Halo",
+                "Back In Black",
+                "Don't Stop Believin'",
+                "Water",
+            ],
+        }
+    )
+    return CatalogResolver.from_dataframe(df)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Beyoncé - Halo!", "beyonce halo"),
+        ("Don't Stop Believin'", "dont stop believin"),
+        ("AC/DC", "acdc"),
+        ("R.E.M.", "rem"),
+        ("deep-house", "deep house"),
+        ("  Love   Story ", "love story"),
+    ],
+)
+def test_normalise(text, expected):
+    assert normalise(text) == expected
+
+
+def test_resolve_artists_exact_match_maps_to_stored_values(resolver):
+    assert resolver.resolve_artists(["taylor swift"]) == [
+        "Taylor Swift",
+        "Taylor Swift;Ed Sheeran",
+    ]
+    assert resolver.resolve_artists(["Ed Sheeran"]) == ["Taylor Swift;Ed Sheeran"]
+
+
+def test_resolve_artists_ignores_accents_and_punctuation(resolver):
+    assert resolver.resolve_artists(["Beyonce"]) == ["Beyoncé"]
+    assert resolver.resolve_artists(["ACDC"]) == ["AC/DC"]
+
+
+def test_resolve_artists_rejects_ambiguous_match(resolver):
+    # "Taylor" matches both "Taylor Swift" and "James Taylor" equally well
+    assert resolver.resolve_artists(["Taylor"]) == ["Taylor"]
+
+
+def test_resolve_artists_prefers_candidates_with_all_tokens(resolver):
+    assert resolver.resolve_artists(["Swift"]) == [
+        "Taylor Swift",
+        "Taylor Swift;Ed Sheeran",
+    ]
+
+
+def test_resolve_artists_keeps_unresolved_names(resolver):
+    assert resolver.resolve_artists(["Nobody Known"]) == ["Nobody Known"]
+
+
+def test_resolve_track(resolver):
+    assert resolver.resolve_track("love story") == "Love Story"
+    assert resolver.resolve_track("Dont Stop Believin") == "Don't Stop Believin'"
+    assert resolver.resolve_track("back in black!") == "Back In Black"
+    assert resolver.resolve_track("Unknown Song") == "Unknown Song"
+
+
+def test_autocomplete(resolver):
+    assert resolver.autocomplete("tay") == ["Tayla", "Taylor Swift"]
+    assert resolver.autocomplete("tay", limit=1) == ["Tayla"]
+    assert resolver.autocomplete("dont", kind="track") == ["Don't Stop Believin'"]
+    assert resolver.autocomplete("beyo") == ["Beyoncé"]
+    assert resolver.autocomplete("  ") == []
@@ -0,0 +1,119 @@
+import json
+import tarfile
+
+import pandas as pd
+import pytest
+from qdrant_client import QdrantClient
+
+from rhythmix_model.preprocessing import snapshot
+from rhythmix_model.preprocessing.create_vector_db import (
+    ATTRIBUTE_COLUMNS,
+    create_vector_db,
+)
+
+
+@pytest.fixture
+def df_vectors() -> pd.DataFrame:
+    rows = []
+    for i in range(50):
+        rows.append(
+            {
+                "track_id": f"track_{i}",
+                "track_link": f"https://open.spotify.com/track/track_{i}",
+                "artists": f"Artist {i % 7}",
+                "track_name": f"Song {i}",
+                "track_genre": ["pop", "deep-house", "hip-hop"][i % 3],
+                "danceability": (i % 10) / 10,
+                "energy": (i % 5) / 5,
+                "key": i % 12,
+                "loudness": -float(i % 20),
+                "mode": i % 2,
+                "speechiness": (i % 4) / 4,
+                "acousticness": (i % 3) / 3,
+                "instrumentalness": (i % 6) / 6,
+                "liveness": (i % 8) / 8,
+                "valence": (i % 9) / 9,
+                "tempo": 80.0 + i,
+                "time_signature": 3 + i % 2,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def client(tmp_path) -> QdrantClient:
+    client = QdrantClient(path=str(tmp_path / "qdrant"))
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def artifact_path(client, df_vectors, tmp_path):
+    create_vector_db(
+        client=client,
+        df_vectors=df_vectors,
+        distance_metric="cosine",
+        collection_name="music_vectors",
+        metadata={
+            "catalog_version": "abc123def456",
+            "feature_scaling": snapshot.feature_scaling_metadata(
+                df_vectors, ATTRIBUTE_COLUMNS
+            ),
+        },
+    )
+    return snapshot.create_snapshot_artifact(
+        client=client,
+        collection_name="music_vectors",
+        output_dir=tmp_path / "artifacts",
+    )
+
+
+def test_snapshot_artifact_round_trip(client, df_vectors, artifact_path):
+    assert artifact_path.name == "music_vectors-abc123def456.tar"
+
+    manifest = snapshot.restore_snapshot_artifact(
+        client=client, artifact_path=artifact_path, collection_name="restored"
+    )
+
+    assert manifest["points_count"] == len(df_vectors)
+    assert client.count("restored", exact=True).count == len(df_vectors)
+    restored_metadata = snapshot.get_catalog_metadata(client, "restored")
+    assert restored_metadata == snapshot.get_catalog_metadata(client, "music_vectors")
+    snapshot.check_catalog_version(client, "restored", "abc123def456")
+    with pytest.raises(RuntimeError, match="catalog version"):
+        snapshot.check_catalog_version(client, "restored", "000000000000")
+
+    query = df_vectors.loc[0, ATTRIBUTE_COLUMNS].astype(float).tolist()
+    original = client.query_points("music_vectors", query=query, limit=5).points
+    restored = client.query_points("restored", query=query, limit=5).points
+    assert [point.id for point in restored] == [point.id for point in original]
+
+
+def test_restore_checks_points_count(client, artifact_path, tmp_path):
+    tampered_path = tmp_path / "tampered.tar"
+    with tarfile.open(artifact_path) as source, tarfile.open(
+        tampered_path, "w"
+    ) as tampered:
+        for member in source.getmembers():
+            data = source.extractfile(member).read()
+            if member.name == snapshot.MANIFEST_NAME:
+                manifest = json.loads(data)
+                manifest["points_count"] += 1
+                data = json.dumps(manifest).encode()
+            snapshot._add_bytes(tampered, member.name, data)
+
+    with pytest.raises(RuntimeError, match="expected 51"):
+        snapshot.restore_snapshot_artifact(
+            client=client, artifact_path=tampered_path, collection_name="restored"
+        )
+
+
+def test_unversioned_collection_has_no_catalog_metadata(client, df_vectors):
+    create_vector_db(
+        client=client,
+        df_vectors=df_vectors,
+        distance_metric="cosine",
+        collection_name="music_vectors",
+    )
+
+    assert snapshot.get_catalog_metadata(client, "music_vectors") == {}